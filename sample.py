@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from tetris_ai import game_init, post_move, info
+from tetris_ai import game_init, post_move, info, QueueClosed
 
 class Your_Model(nn.Module):
     def __init__(self):
@@ -15,7 +15,10 @@ def fit(game_thread, model):
     game = info.get()
     while game_thread.is_alive() and game.running:
         action = model(game.get_state())
-        post_move(action)
+        try:
+            post_move(action)
+        except QueueClosed:
+            break
             
 
 if __name__ == "__main__":
@@ -1,120 +1,17 @@
 import pygame
-from collections import deque
-import random
-from copy import deepcopy
-from enum import Enum
-import numpy as np
+from tetris_engine import GEOMETRY, GRAY, TetroType, control, Tetromino, TetrisEngine
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
-
-class TetroType(Enum):
-    I = 1
-    J = 2
-    L = 3
-    O = 4
-    S = 5
-    Z = 6
-    T = 7
-    SHADOW = 8
-
-class control(Enum):
-    RIGHT_ROTATE = 1
-    LEFT_ROTATE = 2
-    LEFT = 3
-    RIGHT = 4
-    HARD = 5
-    DOWN = 6
-    HOLD = 7
-    RESTART = 8
-    
-    LONG_LEFT = 9
-    LONG_RIGHT = 10
-    SOFT_DROP = 11
-    DROP_RIGHT = 12
-    DROP_LEFT = 13
-    
-
-class Tetromino:
-    
-    rotations = {
-        TetroType.I : [[4, 5, 6, 7], [2, 6, 10, 14], [8, 9, 10, 11], [1, 5, 9, 13]],
-        TetroType.J : [[0, 4, 5, 6], [1, 2, 5, 9], [4, 5, 6, 10], [1, 5, 8, 9]],
-        TetroType.L : [[2, 4, 5, 6], [1, 5, 9, 10], [4, 5, 6, 8], [0, 1, 5, 9]],
-        TetroType.O : [[1, 2, 5, 6]],
-        TetroType.S : [[1, 2, 4, 5], [1, 5, 6, 10], [5, 6, 8, 9], [0, 4, 5, 9]],
-        TetroType.Z : [[0, 1, 5, 6], [2, 5, 6, 9], [4, 5, 9, 10], [1, 4, 5, 8]],
-        TetroType.T : [[1, 4, 5, 6], [1, 5, 6, 9], [4, 5, 6, 9], [1, 4, 5, 9]],
-    }
-    
-    colors = {
-        TetroType.I : (0, 255, 255),
-        TetroType.J : (0, 0, 255),
-        TetroType.L : (255, 127, 0),
-        TetroType.O : (255, 255, 0),
-        TetroType.S : (0, 255, 0),
-        TetroType.Z : (255, 0, 0),
-        TetroType.T : (128, 0, 128),
-        TetroType.SHADOW : GRAY
-    }
-    
-    type2idx = {
-        TetroType.I : 1,
-        TetroType.J : 2,
-        TetroType.L : 3,
-        TetroType.O : 4,
-        TetroType.S : 5,
-        TetroType.Z : 6,
-        TetroType.T : 7,
-    }
-    
-    left_most_x = {
-        TetroType.I : [0, 2, 0, 1],
-        TetroType.O : [1],
-        TetroType.S : [0, 1, 0, 0],
-    }
 
-    width = {
-        TetroType.I : [4, 1, 4, 1],
-        TetroType.O : [2],
-        TetroType.S : [3, 2, 3, 2],
-    }
-    
-    def __init__(self, type_, is_shadow=False):
-        self.type_ = type_
-        self.is_shadow = is_shadow
-        self.color = GRAY if is_shadow else self.colors[self.type_] 
-        self.rotation = 0
-        self.x = 3
-        self.y = 0
-        self.cur_x = 3
-        self.max_x = 9
-        self.next = None
-        self.update_cur_max()
-    
-    def image(self):
-        return self.rotations[self.type_][self.rotation]
-    
-    def rotate(self, rotation_type):
-        self.rotation = (self.rotation + rotation_type) % len(self.rotations[self.type_])
-        self.update_cur_max()
-        
-    def update_cur_max(self):
-        type_ = self.type_ if self.type_ in [TetroType.I, TetroType.O] else TetroType.S
-        self.cur_x =  self.x + self.left_most_x[type_][self.rotation]
-        self.max_x = 10 - self.width[type_][self.rotation]
-
-            
-class Tetris:
-    height = 22
-    width = 10
+class Tetris(TetrisEngine):
     x = 100
     y = 20
     zoom = 20
     next_zoom = zoom / 2
     PRESSING_BOUND = 300
-    fps = 10000
+    # frames drawn per second of wall time, however fast the game ticks
+    render_fps = 60
     screen_size = (400, 500)
     move_keys = {
         control.RIGHT_ROTATE: pygame.K_UP,
@@ -126,62 +23,18 @@ class Tetris:
         control.HOLD: pygame.K_RSHIFT,
         control.RESTART: pygame.K_ESCAPE
     }
-    
-    score_table = {
-        'Double' : 1,
-        'Triple' : 2,
-        'Tetris' : 4,
-        'TSM' : 1,
-        'TSS' : 2,
-        'TSD' : 4,
-        'TST' : 6,
-        'b2b Tetris' : 6,
-        'b2b TSM' : 2,
-        'b2b TSS' : 3,
-        'b2b TSD' : 6,
-        'b2b TST' : 9,
-    }
-    
-    wall_kick = [
-        [(0, 0), ( 0, 0), ( 0, 0), ( 0, 0), ( 0, 0)],
-        [(0, 0), (+1, 0), (+1, -1), ( 0,+2), (+1,+2)],
-        [(0, 0), ( 0, 0), ( 0, 0), ( 0, 0), ( 0, 0)],
-        [(0, 0), (-1, 0), (-1, -1), ( 0,+2), (-1,+2)],
-    ]
-
-    I_wall_kick = [
-        [( 0, 0), (-1, 0), (+2, 0), (-1, 0), (+2, 0)],
-        [(-1, 0), ( 0, 0), ( 0, 0), ( 0,+1), ( 0,-2)],
-        [(-1,+1), (+1,+1), (-2,+1), (+1, 0), (-2, 0)],
-        [( 0,+1), ( 0,+1), ( 0,+1), ( 0,-1), ( 0,+2)],
-    ]
-    
-    combo_table = [0, 1, 1, 2, 2, 3, 3, 4]
-    
-    def __init__(self, display=True):
+
+    def __init__(self, display=True, preview=5, seed=None):
+        super().__init__(seed=seed, preview=preview)
+        # a restart replays the same seed, or draws a new one when None
+        self.fixed_seed = seed
         self.clock = pygame.time.Clock()
-        self.used_held = False
-        self.last_move = None
-        self.last_kick = None
-        self.b2b = False
-        self.combo = -1
-        self.prev_score = 0
-        self.score = 0
-        self.figure = None
-        self.held = None
-        self.shadow = None
-        self.field = deque()
-        self.state = 'start'
-        self.head, self.tail = self._seven_bag()
-        self.remaining_time = 120000
-        self.counter = 0
         self.screen = None
         self.display = display
-        self.reward = 0
-        
+
         if self.display:
             self.screen = pygame.display.set_mode(self.screen_size)
-            
+
         self.start_time = {
             self.move_keys[control.DOWN]: pygame.time.get_ticks(),
             self.move_keys[control.LEFT]: pygame.time.get_ticks(),
@@ -193,316 +46,67 @@ class Tetris:
             self.move_keys[control.LEFT]: False,
             self.move_keys[control.RIGHT]: False
         }
-        self.running = True
-        
-        for i in range(self.height):
-            new_line = []
-            for j in range(self.width):
-                new_line.append(0)
-            self.field.append(new_line)
-        
-    def _intersects(self, shadow=False):
-        item = self.shadow if shadow else self.figure
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in item.image():
-                    if i + item.y > self.height - 1:
-                        return True
-                    if j + item.x > self.width - 1 or j + item.x < 0:
-                        return True
-                    if self.field[i + item.y][j + item.x] != 0:
-                        return True
-        return False
-
-    def _clear(self):
-        cleared = []
-        # check which lines are cleared
-        for line in range(self.height - 1, -1, -1):
-            for j in range(self.width):
-                if self.field[line][j] == 0:
-                    break
-                elif j == self.width - 1:
-                    cleared.append(line)
-        # update 
-        for line in cleared:
-            del self.field[line]
-        for i in range(len(cleared)):
-            self.field.appendleft([0 for j in range(self.width)])
-        return len(cleared)
-            
-    def _calc_score(self, cleared_lines, check_list):
-        T_spin = False
-        mini = False
-        if self.last_move == 'r' and len(check_list) != 0:
-            if check_list[0] != 0 and check_list[1] != 0:
-                T_spin = True
-            elif check_list[0] != 0 or check_list[1] != 0:
-                count = 0
-                for mino in check_list[2:]:
-                    if mino != 0:
-                        count += 1
-                if count == 2:
-                    T_spin = True
-                    mini = True
-                if self.last_kick == 4:
-                    mini = False
-                    
-        if cleared_lines == 4:
-            if self.b2b:
-                self.score += self.score_table['b2b Tetris']
-            else:
-                self.score += self.score_table['Tetris']
-        elif cleared_lines == 3:
-            if T_spin:
-                if self.b2b:
-                    self.score += self.score_table['b2b TST']
-                else:
-                    self.score += self.score_table['TST']
-            else:
-                self.score += self.score_table['Triple']
-        elif cleared_lines == 2:
-            if T_spin:
-                if self.b2b:
-                    self.score += self.score_table['b2b TSD']
-                else:
-                    self.score += self.score_table['TSD']
-            else:
-                self.score += self.score_table['Double']
-        elif cleared_lines == 1:
-            if T_spin:
-                if mini:
-                    if self.b2b:
-                        self.score += self.score_table['b2b TSM']
-                    else:
-                        self.score += self.score_table['TSM']
-                else:
-                    if self.b2b:
-                        self.score += self.score_table['b2b TSS']
-                    else:
-                        self.score += self.score_table['TSS']
-                        
-        if cleared_lines == 4 or T_spin:
-            self.b2b = True
-        else:
-            self.b2b = False
-                    
-        if self.combo >= len(self.combo_table):
-            self.score += self.combo_table[-1]
-        elif self.combo != -1:
-            self.score += self.combo_table[self.combo]
-            
-        perfect = True
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.field[i][j] != 0:
-                    perfect = False
-                    break
-        if perfect:
-            self.score += 10
+        self.key2control = {key: move for move, key in self.move_keys.items()}
 
-        self.reward = self.score - self.prev_score
-        self.prev_score = self.score
+        self.last_render = None
+        self.drawn_cells = None
+        self.drawn_panels = None
+        self.drawn_text = None
+        self.text_rects = []
+        self.finished = False
+        # fonts and surfaces die with pygame.quit(), so never share them
+        # between games
+        self.fonts = {}
+        self.tiles = {}
 
-        
     def _freeze(self):
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in self.figure.image():
-                    if i + self.figure.y < 2:
-                        self.state = 'gameover'
-                    self.field[i + self.figure.y][j + self.figure.x] = self.figure.type_
-                    
+        super()._freeze()
         for key in self.pressing:
             self.pressing[key] = False
-            
+
         for key in self.start_time:
             self.start_time[key] = pygame.time.get_ticks()
-        
-        def calc_loc_val(y, x):
-            if x >= self.width or x < 0:
-                return 1
-            elif y >= self.height:
-                return 1
-            else:
-                return self.field[y][x]
-            
-        check_list = []
-        if self.figure.type_ == TetroType.T:
-            front_pos = [(0, 0), (0, 2), (2, 2), (2, 0), (0, 0)]
-            back_pos = [(2, 2), (2, 0), (0, 0), (0, 2), (2, 2)]
-            for pos_list in [front_pos, back_pos]:
-                for i in range(2):
-                    check_list.append(calc_loc_val(self.figure.y + pos_list[self.figure.rotation + i][0], self.figure.x + pos_list[self.figure.rotation + i][1]))
-                
-        cleared_lines = self._clear()
-        if cleared_lines == 0:
-            self.combo = -1
-        else:
-            self.combo += 1
-            self._calc_score(cleared_lines, check_list)
-        
-        self.used_held = False
-        self.figure = None
-    
-    def _hard_drop(self):
-        if self.figure.y < 0:
-            self.figure.y = 0
-        while not self._intersects():
-            self.figure.y += 1
-        self.figure.y -= 1
-        self._freeze()
-        
-    def _down(self):
-        prev_move = self.last_move
-        self.last_move = 'd'
-        self.figure.y += 1
-        if self._intersects():
-            self.figure.y -= 1
-            self.last_move = prev_move
-        
-    def _move(self, dir):
-        if self.figure:
-            temp = self.figure.x
-            add = 1 if dir == 'right' else -1
-            self.figure.x += add
-            self.figure.update_cur_max()
-            if self._intersects():
-                self.figure.x = temp
-        self._update_shadow()
-        self.last_move = 'm'
-    
-    def _kick(self, ori, new, type_):
-        table = self.I_wall_kick if type_ == TetroType.I else self.wall_kick
-        check_list = []
-        for i in range(5):
-            check_list.append(tuple((table[ori][i][0] - table[new][i][0],
-                                    table[new][i][1] - table[ori][i][1])))
-        original_pos = (self.figure.x, self.figure.y)
-        for i, pos in enumerate(check_list):
-            self.figure.x += pos[0]
-            self.figure.y += pos[1]
-            if self._intersects():
-                self.figure.x, self.figure.y = original_pos
-                continue
-            else:
-                self.last_kick = i
-                return True
-        return False
-            
-    def _rotate(self, type_: int):
-        original_rotate = deepcopy(self.figure.rotation)
-        self.figure.rotate(type_)
-        new_rotate = deepcopy(self.figure.rotation)
-        if not self._kick(original_rotate, new_rotate, type_):
-            self.figure.rotate(type_ * -1)
-        self._update_shadow()
-        self.last_move = 'r'
-        
-    def _make_shadow(self):
-        self.shadow = deepcopy(self.figure)
-        if self.shadow.y < 0:
-            self.shadow.y = 0
-        self.shadow.color = GRAY
-        self.shadow.is_shadow = True
-        
-    def _update_shadow(self):
-        self._make_shadow()
-        while not self._intersects(shadow=True):
-            self.shadow.y += 1
-        self.shadow.y -= 1
-
-    def _hold(self):
-        temp = Tetromino(self.figure.type_)
-        self.figure = self.held
-        self.held = temp
-        if self.figure:
-            self._update_shadow()
-        self.last_move = None
-        
-    def _seven_bag(self):
-        bag = [
-            TetroType.I,
-            TetroType.J, 
-            TetroType.L, 
-            TetroType.O, 
-            TetroType.S, 
-            TetroType.Z, 
-            TetroType.T, 
-        ]
-        random.shuffle(bag)
-        new_figures = [Tetromino(shape) for shape in bag]
-        for i in range(6):
-            new_figures[i].next = new_figures[i + 1]
-        return new_figures[0], new_figures[6]
-        
-    def _update_tetro(self):
-        if not self.head:
-            self.head, self.tail = self._seven_bag()
-
-        if self.figure is None and self.state not in ['gameover', 'timeup']:
-            self.figure = self.head
-            self.head = self.head.next
-            self._update_shadow()
-          
-    def _update_counter(self):
-        
-        self.counter += 1
-        if self.counter % (self.fps/10)  == 0:
-            if self.state == 'start':
-                self._down()
-                
-        if self.state not in ['gameover', 'timeup']:
-            self.remaining_time -= self.clock.tick(self.fps)
-        if self.remaining_time <= 0:
-            self.state = 'timeup'
-          
-            
-    def step(self):
+
+    def _update_counter(self, ticks=1):
+        elapsed = self.clock.tick(self.fps) if self.state not in ['gameover', 'timeup'] else 0
+        super()._update_counter(elapsed, ticks)
+
+    def step(self, ticks=1):
         self._update_tetro()
-        self._update_counter()
-        keys = pygame.key.get_pressed() 
-    
+        self._update_counter(ticks)
+        self._poll_keys()
+        self._handle_events()
+        if self.display and self._render_due():
+            self._update_ui()
+
+        return pygame.time.get_ticks()
+
+    def _poll_keys(self):
+        keys = pygame.key.get_pressed()
+
         for key in self.start_time.keys():
             if keys[key]:
                 current_time = pygame.time.get_ticks()
                 if self.start_time and current_time - self.start_time[key] > self.PRESSING_BOUND:
                     self.pressing[key] = True
-            
+
         if self.pressing[self.move_keys[control.DOWN]]:
             self._down()
         if self.pressing[self.move_keys[control.LEFT]]:
             self._move('left')
         if self.pressing[self.move_keys[control.RIGHT]]:
-            self._move('right')            
-            
+            self._move('right')
+
+    def _handle_events(self):
         for event in pygame.event.get():
             current_time = pygame.time.get_ticks()
             if event.type == pygame.KEYDOWN:
-                if self.state in ['gameover', 'timeup'] :
-                    if event.key == self.move_keys[control.RESTART]:
-                        self.__init__(self.display)
-                else:
-                    if event.key == self.move_keys[control.RIGHT_ROTATE]:
-                        self._rotate(1)
-                    if event.key == self.move_keys[control.LEFT_ROTATE]:
-                        self._rotate(-1)
-                    if event.key == self.move_keys[control.HARD]:
-                        self._hard_drop()
-                    if event.key == self.move_keys[control.DOWN]:
-                        self._down()
+                if event.key == self.move_keys[control.RESTART]:
+                    self.__init__(self.display, self.preview, self.fixed_seed)
+                elif self.state not in ['gameover', 'timeup'] and event.key in self.key2control:
+                    self.apply(self.key2control[event.key])
+                    if event.key in self.start_time:
                         self.start_time[event.key] = current_time
-                    if event.key == self.move_keys[control.LEFT]:
-                        self._move('Left')
-                        self.start_time[event.key] = current_time
-                    if event.key == self.move_keys[control.RIGHT]:
-                        self._move('right')
-                        self.start_time[event.key] = current_time
-                    if event.key == self.move_keys[control.HOLD]:
-                        if not self.used_held:
-                            self._hold()
-                            self.used_held = True
-                    if event.key == self.move_keys[control.RESTART]:
-                        self.__init__(self.display)
             elif event.type == pygame.KEYUP:
                 for key in self.pressing.keys():
                     if event.key == key:
@@ -510,142 +114,161 @@ class Tetris:
                         self.start_time[key] = None
             elif event.type == pygame.QUIT:
                 self.running = False
-                        
-        if self.display:
-            self._update_ui()
-            
-        return pygame.time.get_ticks()
-                
+
+    # Drawing keeps what is on screen and redraws only what changed: board
+    # cells are compared against the last frame, the side panels and texts
+    # are redrawn when their contents change. Fonts, tiles, the background
+    # and the game-over overlay are built once per game.
+    def _font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.SysFont('Calibri', size, True, False)
+        return self.fonts[size]
+
+    def _tile(self, color):
+        if color not in self.tiles:
+            tile = pygame.Surface((self.zoom - 2, self.zoom - 2))
+            tile.fill(color)
+            self.tiles[color] = tile
+        return self.tiles[color]
+
+    def _panel_rect(self, type_, n):
+        start_grid_x = self.x - self.next_zoom * 6 if type_ == 'h' else self.x + self.zoom * self.width
+        start_grid_y = self.y + self.zoom * 2 + self.next_zoom * 6 * n
+        return pygame.Rect(start_grid_x, start_grid_y, self.next_zoom * 6, self.next_zoom * 6)
+
+    def _background(self):
+        if ('background', self.preview) not in self.tiles:
+            background = pygame.Surface(self.screen_size)
+            background.fill(WHITE)
+            for i in range(2, self.height):
+                for j in range(self.width):
+                    pygame.draw.rect(background, GRAY, [self.x + self.zoom * j, self.y + self.zoom * i, self.zoom, self.zoom], 1)
+            for type_, grid_num in [('h', 1), ('n', self.preview)]:
+                for n in range(grid_num):
+                    pygame.draw.rect(background, GRAY, self._panel_rect(type_, n), 1)
+            self.tiles['background', self.preview] = background
+        return self.tiles['background', self.preview]
+
+    def _cell_colors(self):
+        colors = [[Tetromino.colors[mino] if mino else WHITE for mino in row] for row in self.field]
+        # while playing the figure covers its shadow; once the game is over
+        # the shadow is drawn last, as the locked position
+        items = [self.shadow, self.figure]
+        if self.state in ['gameover', 'timeup']:
+            items.reverse()
+        for item in items:
+            if item is not None:
+                for i, j in item.geometry().cells:
+                    if i + item.y >= 2:
+                        colors[i + item.y][j + item.x] = item.color
+        return colors
+
     def _draw_grid(self):
+        dirty = []
+        colors = self._cell_colors()
         for i in range(2, self.height):
             for j in range(self.width):
-                if self.field[i][j] != 0:
-                    pygame.draw.rect(self.screen, Tetromino.colors[self.field[i][j]],
-                                    [self.x + self.zoom * j + 1, self.y + self.zoom * i + 1, self.zoom - 2, self.zoom - 2])                
-                pygame.draw.rect(self.screen, GRAY, [self.x + self.zoom * j, self.y + self.zoom * i, self.zoom, self.zoom], 1)
-
-    def _draw_tetro(self, tetro, x, y, grid: bool, size):
-        for i in range(4):
-            for j in range(4):
-                p = i * 4 + j
-                if p in tetro.image():
-                    if size == self.next_zoom or (i + tetro.y >= 2 and self.state not in  ['gameover', 'timeup']):
-                        pygame.draw.rect(self.screen, tetro.color,
-                                        [x + size * j, y + size * i, size - 1, size - 1])
-                        if grid:
-                            pygame.draw.rect(self.screen, BLACK,
-                                            [x + size * j, y + size * i, size, size], 1)
-        
-    def _draw_small_grid(self, type_):
-        start_grid_x = self.x - self.next_zoom * 6 if type_ == 'h' else self.x + self.zoom * self.width
-        start_grid_y = self.y + self.zoom * 2
-        grid_num = 1 if type_ == 'h' else 5
-        temp = self.held if type_ == 'h' else self.head
-        
-        for n in range(grid_num):
-            pygame.draw.rect(self.screen, GRAY,
-                        [start_grid_x, start_grid_y + self.next_zoom * 6 * n, self.next_zoom * 6, self.next_zoom * 6], 1)
-            if type_ == 'h' and not self.held:
-                break
-            x_edge = 1.5
-            y_edge = 2
-            if temp.type_ == TetroType.I:
-                x_edge = 1
-                y_edge = 1.5
-            elif temp.type_ == TetroType.O:
-                x_edge = 1
-            
-            start_tetro_x = start_grid_x + self.next_zoom * x_edge
-            start_tetro_y = start_grid_y + self.next_zoom * 6 * n + self.next_zoom * y_edge
-            self._draw_tetro(temp, start_tetro_x, start_tetro_y, True, self.next_zoom)
-            temp = temp.next
-            
-            if type_ == 'n' and not temp:
-                new_head, new_tail = self._seven_bag()
-                self.tail.next = new_head
-                self.tail = new_tail
-                temp = new_head
-        
+                if colors[i][j] != self.drawn_cells[i][j]:
+                    dirty.append(self.screen.blit(self._tile(colors[i][j]),
+                                                  (self.x + self.zoom * j + 1, self.y + self.zoom * i + 1)))
+        self.drawn_cells = colors
+        return dirty
+
+    def _draw_tetro(self, tetro_type, x, y, size):
+        color = Tetromino.colors[tetro_type]
+        for i, j in GEOMETRY[tetro_type][0].cells:
+            pygame.draw.rect(self.screen, color, [x + size * j, y + size * i, size - 1, size - 1])
+            pygame.draw.rect(self.screen, BLACK, [x + size * j, y + size * i, size, size], 1)
+
+    def _draw_small_grid(self):
+        dirty = []
+        panels = [('h', 0, self.held.type_ if self.held else None)]
+        panels += [('n', n, tetro_type) for n, tetro_type in enumerate(self._peek(self.preview))]
+        types = [tetro_type for type_, n, tetro_type in panels]
+        if types == self.drawn_panels:
+            return dirty
+        for (type_, n, tetro_type), drawn in zip(panels, self.drawn_panels or [False] * len(panels)):
+            if tetro_type is not None and drawn == tetro_type:
+                continue
+            rect = self._panel_rect(type_, n)
+            self.screen.blit(self._background(), rect, rect)
+            if tetro_type is not None:
+                x_edge = 1.5
+                y_edge = 2
+                if tetro_type == TetroType.I:
+                    x_edge = 1
+                    y_edge = 1.5
+                elif tetro_type == TetroType.O:
+                    x_edge = 1
+                self._draw_tetro(tetro_type, rect.x + self.next_zoom * x_edge, rect.y + self.next_zoom * y_edge, self.next_zoom)
+            dirty.append(rect)
+        self.drawn_panels = types
+        return dirty
+
     def _update_text(self):
-        font = pygame.font.SysFont('Calibri', 25, True, False)
-        text = font.render('Score: ' + str(self.score), True, BLACK)
-        
         minutes, seconds = (self.remaining_time / 1000) / 60, (self.remaining_time / 1000) % 60
-        text_time = font.render('{:02d}:{:02d}'.format(int(minutes), int(seconds)), True, BLACK)
+        texts = ('Score: ' + str(self.score), '{:02d}:{:02d}'.format(int(minutes), int(seconds)))
+        if texts == self.drawn_text:
+            return []
+        dirty = list(self.text_rects)
+        for rect in self.text_rects:
+            self.screen.blit(self._background(), rect, rect)
+        font = self._font(25)
+        text = font.render(texts[0], True, BLACK)
+        text_time = font.render(texts[1], True, BLACK)
         text_time_rect = text_time.get_rect()
         text_time_rect.centerx = self.screen_size[0] / 2
-        
-        font_over = pygame.font.SysFont('Calibri', 65, True, False)
-        text_game_over = font_over.render('Game Over', True, BLACK)
+        self.text_rects = [self.screen.blit(text, [10, 0]), self.screen.blit(text_time, text_time_rect)]
+        self.drawn_text = texts
+        return dirty + self.text_rects
+
+    def _update_ui(self):
+        if self.finished:
+            return
+        full = self.drawn_cells is None
+        if full:
+            self.screen.blit(self._background(), (0, 0))
+            self.drawn_cells = [[WHITE] * self.width for i in range(self.height)]
+        dirty = self._draw_grid() + self._draw_small_grid() + self._update_text()
 
-        self.screen.blit(text, [10, 0])
-        self.screen.blit(text_time, text_time_rect)
-        
         if self.state in ['gameover', 'timeup']:
-            if self.figure:
-                for i in range(4):
-                    for j in range(4):
-                        if i * 4 + j in self.figure.image():
-                            self.field[i + self.figure.y][j + self.figure.x] = self.figure.type_
-                            self.field[i + self.shadow.y][j + self.shadow.x] = TetroType.SHADOW
-                        
-            finish_text = text_game_over if self.state == 'gameover' else text
+            if self.state == 'gameover':
+                finish_text = self._font(65).render('Game Over', True, BLACK)
+            else:
+                finish_text = self._font(25).render('Score: ' + str(self.score), True, BLACK)
             self.finish(finish_text, self.screen_size)
-        pygame.display.flip()
-        
-    def _update_ui(self):
-        self.screen.fill(WHITE)
-        for item in [self.shadow, self.figure]:           
-            if item is not None:
-                self._draw_tetro(item, self.x + self.zoom * item.x + 1, self.y + self.zoom * item.y + 1, False, self.zoom)          
-        self._draw_grid()
-        self._draw_small_grid('h')
-        self._draw_small_grid('n')
-        self._update_text()
-        
+            self.finished = True
+            full = True
+        if full:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+
+    def _render_due(self):
+        now = pygame.time.get_ticks()
+        if self.last_render is not None and now - self.last_render < 1000 / self.render_fps:
+            return False
+        self.last_render = now
+        return True
+
     def finish(self, text, pos):
-        overlay = pygame.Surface(self.screen_size)
-        overlay.fill((255, 255, 255))
-        overlay.set_alpha(128)
-        self.screen.blit(overlay, (0, 0))
+        if 'overlay' not in self.tiles:
+            overlay = pygame.Surface(self.screen_size)
+            overlay.fill((255, 255, 255))
+            overlay.set_alpha(128)
+            self.tiles['overlay'] = overlay
+        self.screen.blit(self.tiles['overlay'], (0, 0))
         
         text_rect = text.get_rect()
         text_rect.center = (pos[0] / 2, pos[1] / 2)
         self.screen.blit(text, text_rect)
-        
-    def get_state(self):
-        while not self.figure:
-            self.step()
-        
-        cur_held_next = []
-        cur_held_next.append(Tetromino.type2idx[self.figure.type_])
-        if not self.held:
-            cur_held_next.append(0)
-        else:
-            cur_held_next.append(Tetromino.type2idx[self.held.type_])
-        
-        next_ = self.head
-        for i in range(5):
-            cur_held_next.append(Tetromino.type2idx[next_.type_])
-            next_ = next_.next
-        cur_held_next = np.array(cur_held_next)
-        
-        grid_info = []
-        for row in self.field:
-            temp = [0 if mino == 0 else 1 for mino in row]
-            grid_info.append(temp)
-        board = np.array(grid_info)
-        
-        return board, cur_held_next
-    
-    def get_reward(self):
-        return self.reward
 
 class Tetris_AI:
-    def __init__(self, game: Tetris):
+    def __init__(self, game: Tetris, instant=False):
         self.game = game
         self.event_queue = []
         self.move_per_sec = 0.01
+        self.instant = instant
     
     def _place_one_tetro(self, moves):
         start_time = self.game.step()
@@ -683,7 +306,14 @@ class Tetris_AI:
         if len(self.event_queue) == 0:
             self.game.step()
             return
-        
+
+        if self.instant:
+            for place_move in self.event_queue:
+                self.game.place(place_move)
+            self.event_queue = []
+            self.game.step()
+            return
+
         for place_move in self.event_queue:
             end_time = self._place_one_tetro(place_move)
         
@@ -695,67 +325,11 @@ class Tetris_AI:
     def move(self, rotation, x: int, down: control, dm: control, turn: int):
         while not self.game.figure:
             self.game.step()
-        
-        f_copy = deepcopy(self.game.figure)
-        for i in range(rotation):
-            f_copy.rotate(1)
-            
-        place_tetro_move = []
-        cur_x = f_copy.cur_x
-        max_x = f_copy.max_x
-        x = min(x, max_x)
-        
-        if rotation == 4:
-            place_tetro_move = [control.HOLD]
-            self.event_queue.append(place_tetro_move)
-            return
-        
-        if rotation == 0:
-            place_tetro_move += []
-        elif rotation == 1:
-            place_tetro_move += [control.RIGHT_ROTATE]
-        elif rotation == 2:
-            place_tetro_move += [control.RIGHT_ROTATE for i in range(2)]
-        elif rotation == 3:
-            place_tetro_move += [control.LEFT_ROTATE]
-        
-        # left and right
-        if x == 0:
-            place_tetro_move += [control.LONG_LEFT]
-        elif x == max_x:
-            place_tetro_move += [control.LONG_RIGHT]
-        elif x == 1:
-            place_tetro_move += [control.LONG_LEFT, control.RIGHT]
-        elif x == max_x - 1:
-            place_tetro_move += [control.LONG_RIGHT, control.LEFT]
-        else:
-            distance = x - cur_x
-            if distance < 0:
-                move = control.LEFT
-                distance *= -1
-            else:
-                move = control.RIGHT
-            place_tetro_move += [move for i in range(distance)]
-        
-        
-        # drop
-        if down == control.HARD:
-            place_tetro_move += [control.HARD]
-            self.event_queue.append(place_tetro_move)
-            return
-        else:
-            place_tetro_move += [control.SOFT_DROP]
-            
-        place_tetro_move += [dm]
-            
-        if down == control.DROP_RIGHT:
-            place_tetro_move += [control.RIGHT_ROTATE for i in range(turn)]
-        elif down == control.DROP_LEFT:
-            place_tetro_move += [control.LEFT_ROTATE for i in range(turn)]
+        self.event_queue.append(self.game.plan_moves(rotation, x, down, dm, turn))
+
+    def place(self, placement):
+        self.event_queue.append(list(placement.path))
 
-        place_tetro_move += [control.HARD]
-        self.event_queue.append(place_tetro_move)
-    
 def main():
     pygame.init()
     game = Tetris()
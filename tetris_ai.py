@@ -1,57 +1,187 @@
+import sys
 import threading
+import time
+from collections import deque
 from tetris import Tetris, Tetris_AI, control
+from tetris_engine import Placement, drop_mapping, move_mapping
 import pygame
 import queue
 
-drop_mapping = {
-    0: control.HARD,
-    1: control.SOFT_DROP,
-    2: control.DROP_LEFT,
-    3: control.DROP_RIGHT,
-}
-move_mapping = {
-    0: control.LONG_LEFT,
-    1: control.LONG_RIGHT,
-    2: None
-}
-
-q = queue.Queue()
+
+class QueueClosed(RuntimeError):
+    pass
+
+
+class MoveQueue:
+    """Moves posted by agents, handed to the game loop in batches.
+
+    A move is an `R X D M T` tuple, a `Placement` or a list of `control`
+    moves. `put` blocks while more than `max_pending` moves are queued or
+    being played, so an agent cannot run arbitrarily far ahead of the game.
+    The time from `put` until the game starts playing a move is kept for
+    `latency`. Once the game ends the queue is closed and `put` raises
+    `QueueClosed` until `reset` reopens it.
+    """
+
+    def __init__(self, max_pending=64):
+        self.max_pending = max_pending
+        self.moves = deque()
+        self.pending = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.latencies = deque(maxlen=4096)
+
+    def put(self, moves, timeout=None):
+        moves = list(moves)
+        with self.cond:
+            has_room = lambda: self.closed or self.pending == 0 or self.pending + len(moves) <= self.max_pending
+            if not self.cond.wait_for(has_room, timeout):
+                raise queue.Full
+            if self.closed:
+                raise QueueClosed('the game is over')
+            now = time.perf_counter()
+            self.moves.extend((move, now) for move in moves)
+            self.pending += len(moves)
+            self.cond.notify_all()
+
+    def get_batch(self, timeout=None):
+        # every queued (move, post time) pair, waiting up to `timeout` for one
+        with self.cond:
+            self.cond.wait_for(lambda: self.moves or self.closed, timeout)
+            batch = list(self.moves)
+            self.moves.clear()
+            return batch
+
+    def started(self, posted):
+        self.latencies.append(time.perf_counter() - posted)
+
+    def done(self, n=1):
+        with self.cond:
+            self.pending -= n
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.moves.clear()
+            self.pending = 0
+            self.cond.notify_all()
+
+    def reset(self):
+        # empty and reopen the queue for a new game
+        with self.cond:
+            self.closed = False
+            self.moves.clear()
+            self.pending = 0
+            self.cond.notify_all()
+
+    def empty(self):
+        return not self.moves
+
+    def latency(self):
+        with self.cond:
+            samples = sorted(self.latencies)
+        if not samples:
+            return {'count': 0}
+        ms = [sample * 1000 for sample in samples]
+        return {'count': len(ms), 'mean_ms': sum(ms) / len(ms), 'p50_ms': ms[len(ms) // 2],
+                'p99_ms': ms[min(len(ms) - 1, len(ms) * 99 // 100)], 'max_ms': ms[-1]}
+
+
+q = MoveQueue()
 info = queue.Queue()
 
-def run_game():
+def _dispatch(player, move):
+    if isinstance(move, Placement):
+        player.place(move)
+    elif isinstance(move, list):
+        # a control path, e.g. from a bot
+        player.event_queue.append(move)
+    else:
+        r, x, d, m, t = move
+        d = drop_mapping[d]
+        m = move_mapping[m]
+        player.move(r, x, d, m, t)
+
+def run_game(bot=None):
+    # a finished game leaves the queue closed and empty; a queue that is
+    # still open keeps moves posted before this game started
+    if q.closed:
+        q.reset()
     pygame.init()
+    try:
+        _play(bot)
+    finally:
+        q.close()
+        pygame.quit()
+
+def _play(bot):
     game = Tetris()
     player = Tetris_AI(game)
-    
+
     info.put(game)
-    
+
+    gravity = game.fps // 10
     while game.running:
-        if not q.empty():
-            r, x, d, m, t = q.get()
-            d = drop_mapping[d]
-            m = move_mapping[m]
-            player.move(r, x, d, m, t)
-        player.play()
-    pygame.quit()
-    
+        # sleep until moves arrive or gravity is due, then advance the game
+        # by the ticks that passed; the bot plays without waiting
+        due = gravity - game.counter % gravity
+        waited = time.perf_counter()
+        moves = q.get_batch(0 if bot is not None and game.state == 'start' else due / game.fps)
+        for move, posted in moves:
+            # each move is planned on the board the previous one left
+            q.started(posted)
+            if game.running and game.state == 'start':
+                _dispatch(player, move)
+                player.play()
+            q.done()
+        if not moves:
+            if bot is not None and game.state == 'start':
+                placement = bot.choose(game)
+                if placement is not None:
+                    player.place(placement)
+                player.play()
+            else:
+                game.step(min(due, max(1, int((time.perf_counter() - waited) * game.fps))))
+
 def post_move(move):
-    q.put(move)
-    
+    q.put([move])
+
+def post_moves(moves):
+    # a batch, or a pre-planned sequence for the coming pieces, in one handoff
+    q.put(moves)
+
+def move_latency():
+    return q.latency()
+
 
 def handle_input(target):
     while target.is_alive():
-        move = map(int, input().split())
-        post_move(move)
-        
-def game_init(input_source, *args):
-    game_thread = threading.Thread(target=run_game)
+        line = sys.stdin.readline()
+        if not line:
+            break
+        # several moves may share a line, e.g. `3 5 3 0 2 4 0 0 2 0`
+        try:
+            values = [int(value) for value in line.split()]
+        except ValueError:
+            values = None
+        if values is None or len(values) % 5:
+            print('expected groups of 5 integers R X D M T, got: ' + line.strip(), file=sys.stderr)
+            continue
+        try:
+            post_moves(tuple(values[i:i + 5]) for i in range(0, len(values), 5))
+        except QueueClosed:
+            break
+
+def game_init(input_source, *args, bot=None):
+    game_thread = threading.Thread(target=run_game, args=[bot])
     game_thread.start()
-    
+
     input_thread = threading.Thread(target=input_source, args=[game_thread, *args])
     input_thread.start()
-    
+
     game_thread.join()
     input_thread.join()
-    
+
 if __name__ == '__main__':
-    game_init(handle_input)
\ No newline at end of file
+    game_init(handle_input)
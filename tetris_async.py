@@ -0,0 +1,216 @@
+import asyncio
+import random
+import time
+from tetris_engine import Placement, TetrisEngine, drop_mapping, move_mapping
+
+
+class SessionClosed(RuntimeError):
+    pass
+
+
+class Session:
+    """One headless game fed by its own bounded async move stream.
+
+    Moves are `R X D M T` tuples, `Placement`s or lists of `control` moves.
+    `send` waits for the move's `(reward, done)`; `post` only queues it and
+    waits while `max_pending` moves are queued. The session ends at game
+    over, after `close()` once the queued moves are played, when no move
+    arrives within `move_timeout` seconds, or `time_limit` seconds after it
+    opened. The last two end it in the 'timeup' state; `remaining_time`
+    follows the session's wall-clock deadline instead of game ticks.
+    """
+
+    def __init__(self, host, session_id, seed=None, time_limit=None, move_timeout=None, max_pending=8):
+        self.host = host
+        self.id = session_id
+        self.game = TetrisEngine(seed=seed)
+        self.time_limit = time_limit
+        self.move_timeout = move_timeout
+        self.moves = asyncio.Queue(max_pending)
+        self.played = 0
+        self.finished = False
+        self.cancelled = False
+        self.feeder = None
+        self.error = None
+        self.task = asyncio.get_running_loop().create_task(self._run())
+        self.task.add_done_callback(self._done)
+
+    def _apply(self, move):
+        game = self.game
+        if isinstance(move, Placement):
+            game.lock(move)
+        elif isinstance(move, list):
+            game.place(move)
+        else:
+            r, x, d, m, t = move
+            game.place(game.plan_moves(r, x, drop_mapping[d], move_mapping[m], t))
+
+    async def _put(self, item):
+        if self.finished:
+            raise SessionClosed('session {} has ended'.format(self.id))
+        await self.moves.put(item)
+        if self.finished:
+            # ended while this put was waiting for room
+            self._drain()
+
+    async def post(self, move):
+        await self._put((move, None))
+
+    async def send(self, move):
+        future = asyncio.get_running_loop().create_future()
+        await self._put((move, future))
+        return await future
+
+    async def feed(self, moves):
+        # play an iterable or async iterable of moves, then close the session
+        try:
+            if hasattr(moves, '__aiter__'):
+                async for move in moves:
+                    await self.post(move)
+            else:
+                for move in moves:
+                    await self.post(move)
+            await self.close()
+        except SessionClosed:
+            pass
+
+    async def close(self):
+        # end after the moves already queued
+        if not self.finished:
+            await self.moves.put(None)
+
+    def cancel(self):
+        self.task.cancel()
+
+    async def wait(self):
+        await asyncio.wait([self.task])
+        return self.summary()
+
+    def summary(self):
+        return {'id': self.id, 'score': self.game.score, 'moves': self.played,
+                'state': self.game.state, 'cancelled': self.cancelled, 'error': self.error}
+
+    def _drain(self):
+        while not self.moves.empty():
+            item = self.moves.get_nowait()
+            if item is not None and item[1] is not None and not item[1].done():
+                item[1].set_exception(SessionClosed('session {} has ended'.format(self.id)))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        game = self.game
+        deadline = None if self.time_limit is None else loop.time() + self.time_limit
+        while game.state == 'start':
+            timeout = self.move_timeout
+            if deadline is not None:
+                left = deadline - loop.time()
+                game.remaining_time = left * 1000
+                timeout = left if timeout is None else min(timeout, left)
+            try:
+                item = await asyncio.wait_for(self.moves.get(), timeout)
+            except asyncio.TimeoutError:
+                game.state = 'timeup'
+                break
+            if item is None:
+                break
+            move, future = item
+            prev_score = game.score
+            try:
+                self._apply(move)
+            except Exception as e:
+                if future is None:
+                    raise
+                future.set_exception(e)
+                continue
+            self.played += 1
+            if future is not None and not future.done():
+                future.set_result((game.score - prev_score, game.state != 'start'))
+            # let every other ready session play a move before this one
+            # plays its next
+            await asyncio.sleep(0)
+
+    def _done(self, task):
+        # runs however the session ended, even if cancelled before it started
+        self.finished = True
+        self.cancelled = task.cancelled()
+        if not self.cancelled:
+            self.error = task.exception()
+        self._drain()
+        if self.feeder is not None:
+            self.feeder.cancel()
+        self.host._finished(self)
+
+
+class SessionHost:
+    """Many `Session`s multiplexed on one asyncio event loop.
+
+    Memory stays bounded: each session queues at most `max_pending` moves,
+    at most `max_sessions` are open at once, and a session is dropped from
+    the host as soon as it ends. `time_limit`, `move_timeout` and
+    `max_pending` are defaults that `open` can override per session.
+    """
+
+    def __init__(self, max_sessions=4096, max_pending=8, time_limit=None, move_timeout=None):
+        self.max_sessions = max_sessions
+        self.defaults = {'max_pending': max_pending, 'time_limit': time_limit, 'move_timeout': move_timeout}
+        self.sessions = {}
+        self.next_id = 0
+        self.finished = 0
+        self.total_moves = 0
+
+    def open(self, seed=None, moves=None, **options):
+        # must be called from a running event loop
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError('too many sessions')
+        session = Session(self, self.next_id, seed, **{**self.defaults, **options})
+        self.next_id += 1
+        self.sessions[session.id] = session
+        if moves is not None:
+            session.feeder = asyncio.get_running_loop().create_task(session.feed(moves))
+        return session
+
+    def _finished(self, session):
+        self.sessions.pop(session.id, None)
+        self.finished += 1
+        self.total_moves += session.played
+
+    async def join(self):
+        # wait for every open session to end
+        while self.sessions:
+            await asyncio.wait([session.task for session in list(self.sessions.values())])
+
+    async def close(self, cancel=True):
+        sessions = list(self.sessions.values())
+        for session in sessions:
+            if cancel:
+                session.cancel()
+            else:
+                await session.close()
+        await asyncio.gather(*(session.wait() for session in sessions))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def random_moves(seed=None):
+    rng = random.Random(seed)
+    while True:
+        yield (rng.randrange(4), rng.randrange(10), 0, 2, 0)
+
+
+async def main(n_sessions=1000):
+    start = time.perf_counter()
+    async with SessionHost(time_limit=60) as host:
+        for i in range(n_sessions):
+            host.open(seed=i, moves=random_moves(i))
+        await host.join()
+    elapsed = time.perf_counter() - start
+    print('{} sessions, {} moves in {:.2f}s ({:.0f} moves/sec)'.format(
+        host.finished, host.total_moves, elapsed, host.total_moves / elapsed))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
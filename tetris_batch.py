@@ -0,0 +1,190 @@
+import numpy as np
+from tetris_engine import GEOMETRY, TetroType, Tetromino, TetrisEngine
+
+# geometry indexed by Tetromino.type2idx (row 0 unused) and rotation count
+CELLS = np.zeros((8, 4, 4, 2), dtype=np.int64)
+LEFT = np.zeros((8, 4), dtype=np.int64)
+WIDTH = np.ones((8, 4), dtype=np.int64)
+for _type, _images in GEOMETRY.items():
+    for _r in range(4):
+        _geometry = _images[_r % len(_images)]
+        CELLS[Tetromino.type2idx[_type], _r] = _geometry.cells
+        LEFT[Tetromino.type2idx[_type], _r] = _geometry.left
+        WIDTH[Tetromino.type2idx[_type], _r] = _geometry.width
+ROTATIONS = np.array([1] + [len(GEOMETRY[t]) for t in Tetromino.type2idx])
+T_IDX = Tetromino.type2idx[TetroType.T]
+
+# T-spin corners per rotation, in the order _spin_corners checks them
+_front_pos = [(0, 0), (0, 2), (2, 2), (2, 0), (0, 0)]
+_back_pos = [(2, 2), (2, 0), (0, 0), (0, 2), (2, 2)]
+CORNERS = np.array([[_front_pos[r], _front_pos[r + 1], _back_pos[r], _back_pos[r + 1]] for r in range(4)])
+
+
+def _score_lookup():
+    # [b2b, spin (0 none, 1 mini, 2 full), cleared lines] -> points, as in _calc_score
+    table = TetrisEngine.score_table
+    score = np.zeros((2, 3, 5), dtype=np.int64)
+    for b2b in range(2):
+        prefix = 'b2b ' if b2b else ''
+        for spin in range(3):
+            score[b2b, spin, 4] = table[prefix + 'Tetris'] if b2b else table['Tetris']
+            score[b2b, spin, 3] = table[prefix + 'TST'] if spin else table['Triple']
+            score[b2b, spin, 2] = table[prefix + 'TSD'] if spin else table['Double']
+        score[b2b, 1, 1] = table[prefix + 'TSM']
+        score[b2b, 2, 1] = table[prefix + 'TSS']
+    return score
+
+SCORE = _score_lookup()
+COMBO = np.array(TetrisEngine.combo_table)
+
+
+class BatchTetris:
+    """N games stepped together, one hard-dropped placement per game per call.
+
+    An action is `hold * 40 + R * 10 + X`, with R and X as in the README move
+    format (X is clamped to the rightmost legal column like `plan_moves` does).
+    Pieces drop straight down from the spawn row, so tucks and soft-drop spins
+    are not reachable here; use `TetrisEngine.placements` for those.
+    """
+    height = TetrisEngine.height
+    width = TetrisEngine.width
+    n_actions = 80
+    queue_size = 14
+
+    def __init__(self, n, preview=5, seed=None, auto_reset=True):
+        self.n = n
+        self.preview = preview
+        self.auto_reset = auto_reset
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, self.height, self.width), dtype=np.uint8)
+        self.queue = np.zeros((n, self.queue_size + preview), dtype=np.int64)
+        self.queue_len = np.zeros(n, dtype=np.int64)
+        self.cur = np.zeros(n, dtype=np.int64)
+        self.held = np.zeros(n, dtype=np.int64)
+        self.combo = np.full(n, -1, dtype=np.int64)
+        self.b2b = np.zeros(n, dtype=bool)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def _refill(self):
+        games = np.flatnonzero(self.queue_len <= self.preview + 1)
+        while len(games):
+            bags = self.rng.permuted(np.tile(np.arange(1, 8), (len(games), 1)), axis=1)
+            cols = self.queue_len[games, None] + np.arange(7)
+            self.queue[games[:, None], cols] = bags
+            self.queue_len[games] += 7
+            games = games[self.queue_len[games] <= self.preview + 1]
+
+    def _pop(self, games):
+        pieces = self.queue[games, 0]
+        self.queue[games, :-1] = self.queue[games, 1:]
+        self.queue_len[games] -= 1
+        self._refill()
+        return pieces
+
+    def reset(self, mask=None):
+        games = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+        self.boards[games] = 0
+        self.queue[games] = 0
+        self.queue_len[games] = 0
+        self.held[games] = 0
+        self.combo[games] = -1
+        self.b2b[games] = False
+        self.score[games] = 0
+        self.done[games] = False
+        self._refill()
+        self.cur[games] = self._pop(games)
+        return self.observe()
+
+    def observe(self):
+        pieces = np.concatenate([self.cur[:, None], self.held[:, None],
+                                 self.queue[:, :self.preview]], axis=1)
+        return (self.boards != 0).astype(np.uint8), pieces
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        live = np.flatnonzero(~self.done)
+        hold = actions[live] // 40 == 1
+        rotation = actions[live] // 10 % 4
+        column = actions[live] % 10
+        rewards = np.zeros(self.n, dtype=np.int64)
+
+        # hold swaps with the held piece, or pulls the next one when empty
+        holding = live[hold]
+        swap = holding[self.held[holding] != 0]
+        fresh = holding[self.held[holding] == 0]
+        self.cur[swap], self.held[swap] = self.held[swap], self.cur[swap]
+        self.held[fresh] = self.cur[fresh]
+        if len(fresh):
+            self.cur[fresh] = self._pop(fresh)
+
+        piece = self.cur[live]
+        rotation = rotation % ROTATIONS[piece]
+        left = LEFT[piece, rotation]
+        column = np.minimum(column, self.width - WIDTH[piece, rotation])
+        x = column - left
+        cells = CELLS[piece, rotation]
+        rows, cols = cells[:, :, 0], cells[:, :, 1] + x[:, None]
+
+        boards = self.boards[live] != 0
+        filled = boards.any(axis=1)
+        top = np.where(filled, boards.argmax(axis=1), self.height)
+        y = (np.take_along_axis(top, cols, axis=1) - rows - 1).min(axis=1)
+        rows = rows + y[:, None]
+
+        # plan_moves only shifts when the target column differs from spawn,
+        # so a rotated T that drops in place still counts as a spin
+        spawn_column = 3 + left
+        max_column = self.width - WIDTH[piece, rotation]
+        shifted = (column != spawn_column) | (column <= 1) | (column >= max_column - 1)
+        spin_ok = (piece == T_IDX) & (rotation != 0) & ~shifted
+        corner_y = y[:, None] + CORNERS[rotation, :, 0]
+        corner_x = x[:, None] + CORNERS[rotation, :, 1]
+        outside = (corner_x < 0) | (corner_x >= self.width) | (corner_y >= self.height)
+        inside_y = np.clip(corner_y, 0, self.height - 1)
+        inside_x = np.clip(corner_x, 0, self.width - 1)
+        corner = outside | (boards[np.arange(len(live))[:, None], inside_y, inside_x] & (corner_y >= 0))
+        front = corner[:, 0] & corner[:, 1]
+        one_front = corner[:, 0] | corner[:, 1]
+        back = corner[:, 2] & corner[:, 3]
+        t_spin = spin_ok & (front | (one_front & back))
+        mini = spin_ok & ~front & one_front & back
+
+        over = (rows < 2).any(axis=1)
+        placed = self.boards[live]
+        safe_rows = np.clip(rows, 0, self.height - 1)
+        placed[np.arange(len(live))[:, None], safe_rows, cols] = piece[:, None]
+
+        # line clear: stable sort full rows to the top, then empty them
+        full = (placed != 0).all(axis=2)
+        lines = full.sum(axis=1)
+        clearing = np.flatnonzero(lines)
+        if len(clearing):
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            compacted = np.take_along_axis(placed[clearing], order[:, :, None], axis=1)
+            compacted[np.arange(self.height)[None, :] < lines[clearing, None]] = 0
+            placed[clearing] = compacted
+        self.boards[live] = placed
+
+        cleared = lines > 0
+        combo = np.where(cleared, self.combo[live] + 1, -1)
+        b2b = self.b2b[live]
+        spin = np.where(t_spin, np.where(mini, 1, 2), 0)
+        gained = SCORE[b2b.astype(np.int64), spin, lines]
+        gained += np.where(combo >= 0, COMBO[np.clip(combo, 0, len(COMBO) - 1)], 0)
+        gained += np.where(cleared & ~placed.any(axis=(1, 2)), 10, 0)
+        gained *= cleared
+        self.b2b[live] = np.where(cleared, (lines == 4) | t_spin, b2b)
+        self.combo[live] = combo
+        self.score[live] += gained
+        rewards[live] = gained
+
+        self.done[live] = over
+        self.cur[live] = self._pop(live)
+
+        dones = self.done.copy()
+        if self.auto_reset and dones.any():
+            self.reset(dones)
+        boards, pieces = self.observe()
+        return (boards, pieces), rewards, dones
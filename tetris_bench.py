@@ -0,0 +1,246 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+from tetris_engine import TetrisEngine, control
+
+
+def _engine(seed):
+    return TetrisEngine(seed=seed)
+
+
+def _games(seed, pieces, make=_engine):
+    # fixed-seed scripted play: each game hard-drops moves drawn from its own
+    # seed and a new game starts when one tops out
+    placed = 0
+    game_seed = seed
+    while placed < pieces:
+        game = make(game_seed)
+        rng = random.Random(game_seed)
+        while game.state == 'start' and placed < pieces:
+            yield game, rng.randrange(4), rng.randrange(game.width)
+            placed += 1
+        game_seed += 1
+
+
+def _latency(fn, n, setup=None):
+    # setup runs before each call, outside the timed region
+    times = []
+    for i in range(n):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1e6
+    return {'mean_us': float(times.mean()), 'p50_us': float(np.percentile(times, 50)),
+            'p99_us': float(np.percentile(times, 99)), 'calls': n}
+
+
+def _states(seed, n):
+    snapshots = []
+    for game, r, x in _games(seed, n):
+        game._update_tetro()
+        snapshots.append(game.snapshot())
+        game.place(game.plan_moves(r, x, control.HARD, None, 0))
+    return snapshots
+
+
+def bench_engine(seed, pieces):
+    start = time.perf_counter()
+    for game, r, x in _games(seed, pieces):
+        game.place(game.plan_moves(r, x, control.HARD, None, 0))
+    elapsed = time.perf_counter() - start
+    return {'pieces': pieces, 'seconds': elapsed, 'pieces_per_sec': pieces / elapsed}
+
+
+def bench_placements(seed, states):
+    snapshots = _states(seed, states)
+    game = TetrisEngine()
+    found = 0
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        game.restore(snapshot)
+        found += len(game.afterstates().placements)
+    elapsed = time.perf_counter() - start
+    return {'states': states, 'placements': found, 'seconds': elapsed,
+            'placements_per_sec': found / elapsed, 'states_per_sec': states / elapsed}
+
+
+def bench_calls(seed, states, calls):
+    snapshots = _states(seed, states)
+    game = TetrisEngine()
+    game.restore(snapshots[-1])
+    game._update_tetro()
+    results = {
+        'get_state': _latency(game.get_state, calls),
+        'features': _latency(game.features, calls),
+        'zobrist': _latency(game.zobrist, calls),
+        'snapshot': _latency(game.snapshot, calls),
+        '_intersects': _latency(game._intersects, calls),
+        '_update_shadow': _latency(game._update_shadow, calls),
+    }
+
+    # _hard_drop locks the piece, so each call starts from a restored one
+    cycle = itertools.cycle(snapshots)
+    results['restore'] = _latency(lambda: game.restore(next(cycle)), calls)
+
+    def setup():
+        game.restore(next(cycle))
+        game._update_tetro()
+    results['_hard_drop'] = _latency(game._hard_drop, calls, setup)
+    return results
+
+
+def bench_bridge(seed, pieces):
+    import pygame
+    from tetris import Tetris, Tetris_AI
+    pygame.init()
+
+    def make(game_seed):
+        game = Tetris(display=False, seed=game_seed)
+        game.player = Tetris_AI(game, instant=True)
+        return game
+
+    start = time.perf_counter()
+    for game, r, x in _games(seed, pieces, make):
+        game.player.move(r, x, control.HARD, None, 0)
+        game.player.play()
+    elapsed = time.perf_counter() - start
+    pygame.quit()
+    return {'pieces': pieces, 'seconds': elapsed, 'pieces_per_sec': pieces / elapsed}
+
+
+def bench_frontend(seed, calls, pieces):
+    import pygame
+    from tetris import Tetris, Tetris_AI
+    pygame.init()
+    game = Tetris(seed=seed)
+    results = {'step': _latency(game.step, calls)}
+
+    # the real-time agent path posts key events and waits between moves,
+    # so a placement takes wall-clock time by design
+    games = _games(seed, pieces, lambda game_seed: Tetris(seed=game_seed))
+    planned = []
+
+    def setup():
+        game, r, x = next(games)
+        planned[:] = [Tetris_AI(game), game.plan_moves(r, x, control.HARD, None, 0)]
+    results['_place_one_tetro'] = _latency(lambda: planned[0]._place_one_tetro(planned[1]), pieces, setup)
+    pygame.quit()
+    return results
+
+
+def bench_render(seed, frames):
+    import pygame
+    from tetris import Tetris
+    pygame.init()
+    game = Tetris(seed=seed)
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for frame in range(frames):
+        if frame % 10 == 0:
+            if game.state != 'start':
+                game.__init__(game.display, seed=game.seed + 1)
+            game.place(game.plan_moves(rng.randrange(4), rng.randrange(game.width), control.HARD, None, 0))
+            game._update_tetro()
+        game._update_ui()
+    elapsed = time.perf_counter() - start
+    pygame.quit()
+    return {'frames': frames, 'seconds': elapsed, 'frames_per_sec': frames / elapsed}
+
+
+def bench_memory(seed, pieces):
+    tracemalloc.start()
+    for game, r, x in _games(seed, pieces):
+        game.place(game.plan_moves(r, x, control.HARD, None, 0))
+        game.afterstates()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'pieces': pieces, 'peak_bytes': peak}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline, results):
+    old = _flatten(baseline['results'])
+    for key, value in _flatten(results['results']).items():
+        if old.get(key):
+            print('{:45s} {:>14.3f} {:>14.3f} {:>7.2f}x'.format(key, old[key], value, value / old[key]))
+
+
+def run(args):
+    results = {}
+    results['engine'] = bench_engine(args.seed, args.pieces)
+    results['placements'] = bench_placements(args.seed, args.states)
+    results['calls'] = bench_calls(args.seed, args.states, args.calls)
+    results['memory'] = bench_memory(args.seed, args.states)
+    if not args.no_pygame:
+        results['bridge'] = bench_bridge(args.seed, args.pieces)
+        results['frontend'] = bench_frontend(args.seed, args.calls, args.realtime_pieces)
+        results['render'] = bench_render(args.seed, args.frames)
+    return {
+        'commit': _commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'args': vars(args),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the engine, agent bridge and renderer.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pieces', type=int, default=2000, help='pieces placed by scripted games')
+    parser.add_argument('--states', type=int, default=100, help='positions for placement and latency runs')
+    parser.add_argument('--calls', type=int, default=2000, help='calls per latency measurement')
+    parser.add_argument('--frames', type=int, default=300, help='frames drawn by the render benchmark')
+    parser.add_argument('--realtime-pieces', type=int, default=10,
+                        help='pieces placed through the real-time Tetris_AI path')
+    parser.add_argument('--no-pygame', action='store_true', help='skip the bridge and render benchmarks')
+    parser.add_argument('--output', help='write results as JSON to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to print ratios against')
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import time
+import numpy as np
+from tetris_engine import TetrisEngine
+from tetris_features import board_features
+
+
+class HeuristicEvaluator:
+    """Weighted sum of `board_features` over a batch of afterstates.
+
+    Any callable taking an `Afterstates` and returning one value per row
+    (higher is better) can be used in its place, e.g. a learned value model.
+    """
+    weights = {
+        'height': -0.5,
+        'holes': -4.0,
+        'bumpiness': -0.3,
+        'row_transitions': -0.4,
+        'column_transitions': -1.0,
+        'wells': -0.3,
+    }
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.weights, **(weights or {}))
+
+    def __call__(self, afterstates):
+        features = board_features(afterstates.boards)
+        values = (self.weights['height'] * features.heights.sum(axis=1)
+                  + self.weights['holes'] * features.holes
+                  + self.weights['bumpiness'] * features.bumpiness
+                  + self.weights['row_transitions'] * features.row_transitions
+                  + self.weights['column_transitions'] * features.column_transitions
+                  + self.weights['wells'] * features.wells.sum(axis=1))
+        return np.where(afterstates.done, -1e9, values)
+
+
+class BeamSearchBot:
+    """Picks placements by beam search over the current piece, the hold piece
+    and the preview queue.
+
+    Each level expands every beam node with `afterstates`, ranks the children
+    by `evaluator` plus `reward_weight` times the score gained on the way, and
+    keeps the best `beam_width` distinct positions (deduplicated by Zobrist
+    hash). The search stops after `depth` pieces, or when `time_budget`
+    seconds have passed, and returns the first placement of the best line.
+    `depth` is capped at the pieces the player can see, so the search never
+    looks past the preview.
+    """
+
+    def __init__(self, evaluator=None, beam_width=8, depth=3, time_budget=None, hold=True, reward_weight=5.0):
+        self.evaluator = evaluator or HeuristicEvaluator()
+        self.beam_width = beam_width
+        self.depth = depth
+        self.time_budget = time_budget
+        self.hold = hold
+        self.reward_weight = reward_weight
+        self.sim = TetrisEngine()
+
+    def _visible_depth(self, game):
+        # the current piece and the preview; holding into an empty slot
+        # spends one preview piece without placing it
+        return game.preview + 1 - (self.hold and game.held is None)
+
+    def choose(self, game):
+        start = time.perf_counter()
+        sim = self.sim
+        # (value, score gained, first placement, snapshot, finished)
+        beam = [(0.0, 0, None, game.snapshot(), False)]
+        for level in range(min(self.depth, self._visible_depth(game))):
+            candidates = []
+            for node in beam:
+                value, gained, first, snapshot, finished = node
+                if self.time_budget is not None and level and time.perf_counter() - start > self.time_budget:
+                    # a half-expanded level would favour the nodes it reached
+                    return beam[0][2]
+                if finished:
+                    candidates.append((value, gained, first, snapshot, None))
+                    continue
+                sim.restore(snapshot)
+                afterstates = sim.afterstates(self.hold)
+                totals = gained + afterstates.reward
+                values = self.evaluator(afterstates) + self.reward_weight * totals
+                for k, placement in enumerate(afterstates.placements):
+                    candidates.append((values[k], totals[k], first or placement, snapshot, placement))
+            if not candidates:
+                break
+
+            candidates.sort(key=lambda candidate: -candidate[0])
+            seen = set()
+            beam = []
+            for value, gained, first, snapshot, placement in candidates:
+                if placement is None:
+                    beam.append((value, gained, first, snapshot, True))
+                else:
+                    sim.restore(snapshot)
+                    sim.lock(placement)
+                    key = sim.zobrist()
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    beam.append((value, gained, first, sim.snapshot(), sim.state != 'start'))
+                if len(beam) == self.beam_width:
+                    break
+        return beam[0][2]
+
+    def __call__(self, game):
+        placement = self.choose(game)
+        return None if placement is None else list(placement.path)
+
+
+def watch(game_thread):
+    game_thread.join()
+
+
+if __name__ == '__main__':
+    from tetris_ai import game_init
+    game_init(watch, bot=BeamSearchBot(time_budget=0.2))
@@ -0,0 +1,134 @@
+import numpy as np
+from tetris_dataset import BOARD_BYTES, pack_boards, unpack_boards
+
+# One transition: boards bit-packed to 28 bytes, pieces as the 7 cur/held/
+# next indices, the action as a `TetrisEnv.action_space` index.
+TRANSITION = np.dtype([
+    ('board', np.uint8, (BOARD_BYTES,)),
+    ('pieces', np.uint8, (7,)),
+    ('action', np.uint16),
+    ('reward', np.float32),
+    ('next_board', np.uint8, (BOARD_BYTES,)),
+    ('next_pieces', np.uint8, (7,)),
+    ('done', np.bool_),
+])
+
+
+class SumTree:
+    """Priorities of `capacity` slots in a flat binary tree, every node
+    holding the sum of its children; node 1 is the root and leaves start at
+    `size`. Updates and lookups work on whole batches, one level at a time.
+    """
+
+    def __init__(self, capacity):
+        self.size = 2
+        while self.size < capacity:
+            self.size *= 2
+        self.tree = np.zeros(2 * self.size)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.size
+        self.tree[nodes] = priorities
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        # leaf index of each value in [0, total), by walking down the tree
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.size:
+            left = self.tree[2 * nodes]
+            right = values >= left
+            values -= left * right
+            nodes = 2 * nodes + right
+        return nodes - self.size
+
+
+class ReplayBuffer:
+    """Prioritized replay of `get_state` observations in a memory-mapped file.
+
+    Transitions live in a `TRANSITION` array at `path` (in memory when
+    `path` is None) and overwrite the oldest once `capacity` is reached.
+    New transitions get the highest priority seen so far; `sample` draws
+    proportionally to priority ** `alpha` and returns importance weights
+    for `beta`, and `update_priorities` takes new TD errors.
+    """
+
+    def __init__(self, capacity, path=None, alpha=0.6, beta=0.4, eps=1e-6):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        if path is None:
+            self.data = np.zeros(capacity, dtype=TRANSITION)
+        else:
+            self.data = np.memmap(path, dtype=TRANSITION, mode='w+', shape=(capacity,))
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, board, pieces, action, reward, next_board, next_pieces, done):
+        self.add_batch(np.asarray(board)[None], np.asarray(pieces)[None], [action], [reward],
+                       np.asarray(next_board)[None], np.asarray(next_pieces)[None], [done])
+
+    def add_batch(self, boards, pieces, actions, rewards, next_boards, next_pieces, dones):
+        n = len(actions)
+        indices = (self.position + np.arange(n)) % self.capacity
+        data = self.data
+        data['board'][indices] = pack_boards(boards)
+        data['pieces'][indices] = pieces
+        data['action'][indices] = actions
+        data['reward'][indices] = rewards
+        data['next_board'][indices] = pack_boards(next_boards)
+        data['next_pieces'][indices] = next_pieces
+        data['done'][indices] = dones
+        self.tree.update(indices, self.max_priority ** self.alpha)
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return indices
+
+    def sample(self, batch_size, beta=None, rng=None):
+        """A minibatch as a dict of arrays, boards unpacked to
+        `(batch_size, 22, 10)` uint8, with the `indices` to pass back to
+        `update_priorities` and normalised importance `weights`. Raises
+        ValueError while the buffer is empty.
+        """
+        if self.size == 0:
+            raise ValueError('cannot sample from an empty buffer')
+        rng = rng or np.random.default_rng()
+        beta = self.beta if beta is None else beta
+        total = self.tree.total()
+        # one draw from each of batch_size equal slices of the total
+        values = (np.arange(batch_size) + rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+        probabilities = self.tree.tree[indices + self.tree.size] / total
+        weights = (self.size * probabilities) ** -beta
+        batch = self.data[indices]
+        return {
+            'boards': unpack_boards(batch['board']),
+            'pieces': batch['pieces'],
+            'actions': batch['action'],
+            'rewards': batch['reward'],
+            'next_boards': unpack_boards(batch['next_board']),
+            'next_pieces': batch['next_pieces'],
+            'dones': batch['done'],
+            'indices': indices,
+            'weights': (weights / weights.max()).astype(np.float32),
+        }
+
+    def update_priorities(self, indices, errors):
+        priorities = np.abs(errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def flush(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
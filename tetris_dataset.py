@@ -0,0 +1,249 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import random
+import traceback
+import numpy as np
+from tetris_engine import TetrisEngine, drop_mapping, move_mapping
+
+# One fixed-width record per move: the observation the move was chosen
+# from, the R X D M T move, the score it gained and whether the game ended.
+# Boards are bit-packed, 22 x 10 cells into 28 bytes.
+BOARD_CELLS = TetrisEngine.height * TetrisEngine.width
+BOARD_BYTES = (BOARD_CELLS + 7) // 8
+RECORD = np.dtype([
+    ('board', np.uint8, (BOARD_BYTES,)),
+    ('pieces', np.uint8, (7,)),
+    ('action', np.uint8, (5,)),
+    ('reward', np.int32),
+    ('done', np.bool_),
+])
+INDEX = 'index.json'
+
+
+def pack_boards(boards):
+    # (..., 22, 10) cells to (..., 28) bytes
+    boards = np.asarray(boards, dtype=np.uint8)
+    return np.packbits(boards.reshape(boards.shape[:-2] + (BOARD_CELLS,)), axis=-1)
+
+
+def unpack_boards(packed):
+    boards = np.unpackbits(packed, axis=-1, count=BOARD_CELLS)
+    return boards.reshape(packed.shape[:-1] + (TetrisEngine.height, TetrisEngine.width))
+
+
+class RandomPolicy:
+    """Picks a uniformly random hard drop, the simplest baseline policy.
+
+    Moves are drawn from a generator seeded per game, so a dataset does not
+    depend on how games were split across workers.
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.game = None
+        self.rng = None
+
+    def __call__(self, game):
+        if game is not self.game:
+            self.game = game
+            self.rng = random.Random(game.seed ^ self.seed)
+        return (self.rng.randrange(4), self.rng.randrange(game.width), 0, 2, 0)
+
+
+class ShardWriter:
+    """Appends records to memory-mapped shard files of `shard_bytes` each.
+
+    A shard is preallocated, filled in place and handed to `on_shard(name,
+    records)` once full; the last one is truncated to its records on close.
+    """
+
+    def __init__(self, directory, prefix, shard_bytes=64 << 20, on_shard=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.capacity = max(1, shard_bytes // RECORD.itemsize)
+        self.on_shard = on_shard
+        self.shards = 0
+        self.shard = None
+        self.count = 0
+
+    def _open(self):
+        self.name = '{}-{:05d}.bin'.format(self.prefix, self.shards)
+        self.shards += 1
+        self.shard = np.memmap(os.path.join(self.directory, self.name), dtype=RECORD,
+                               mode='w+', shape=(self.capacity,))
+        self.count = 0
+
+    def _close_shard(self):
+        shard, self.shard = self.shard, None
+        shard.flush()
+        del shard
+        if self.count < self.capacity:
+            os.truncate(os.path.join(self.directory, self.name), self.count * RECORD.itemsize)
+        if self.on_shard is not None:
+            self.on_shard(self.name, self.count)
+
+    def append(self, board, pieces, action, reward, done):
+        if self.shard is None:
+            self._open()
+        self.shard[self.count] = (pack_boards(board), pieces, action, reward, done)
+        self.count += 1
+        if self.count == self.capacity:
+            self._close_shard()
+
+    def close(self):
+        if self.shard is not None and self.count:
+            self._close_shard()
+
+
+def play(game, policy, writer, max_steps=None):
+    # get_state views change with the move, so keep a copy of the observation
+    board = np.empty((game.height, game.width), dtype=np.uint8)
+    pieces = np.empty(2 + game.preview, dtype=np.uint8)
+    steps = 0
+    while game.state == 'start' and (max_steps is None or steps < max_steps):
+        game.get_state(out=(board, pieces))
+        r, x, d, m, t = move = policy(game)
+        prev_score = game.score
+        game.place(game.plan_moves(r, x, drop_mapping[d], move_mapping[m], t))
+        steps += 1
+        done = game.state != 'start' or steps == max_steps
+        writer.append(board, pieces, move, game.score - prev_score, done)
+    return steps
+
+
+def _worker(worker, directory, seeds, policy, shard_bytes, max_steps, results):
+    # puts (shard name, records) as shards fill, then None when done or the
+    # traceback of a failure
+    try:
+        writer = ShardWriter(directory, 'w{:03d}'.format(worker), shard_bytes,
+                             lambda name, records: results.put((name, records)))
+        for seed in seeds:
+            play(TetrisEngine(seed=seed), policy, writer, max_steps)
+        writer.close()
+    except Exception:
+        results.put(traceback.format_exc())
+    else:
+        results.put(None)
+
+
+def _write_index(directory, shards):
+    index = {'record': RECORD.descr, 'record_size': RECORD.itemsize,
+             'shards': [{'file': name, 'records': records} for name, records in shards]}
+    path = os.path.join(directory, INDEX)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(path + '.tmp', path)
+
+
+def generate(directory, n_games, policy=None, n_workers=None, seed=0, shard_bytes=64 << 20, max_steps=None):
+    """Plays games `seed` to `seed + n_games - 1` across worker processes and
+    writes every move to shards in `directory`.
+
+    `policy(game)` returns an R X D M T move; it must be picklable and
+    defaults to `RandomPolicy`. The index is rewritten as each shard is
+    finished, so a partial build can already be read. A worker that fails
+    or dies stops the build with RuntimeError.
+    """
+    os.makedirs(directory, exist_ok=True)
+    policy = policy or RandomPolicy(seed)
+    n_workers = min(n_workers or os.cpu_count() or 1, n_games)
+    results = mp.Queue()
+    workers = []
+    for worker, seeds in enumerate(np.array_split(np.arange(seed, seed + n_games), n_workers)):
+        process = mp.Process(target=_worker, daemon=True,
+                             args=(worker, directory, seeds.tolist(), policy, shard_bytes, max_steps, results))
+        process.start()
+        workers.append(process)
+
+    shards = []
+    running = len(workers)
+    try:
+        while running:
+            try:
+                shard = results.get(timeout=1)
+            except queue.Empty:
+                # a worker killed before it could report anything
+                for process in workers:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError('dataset worker exited with code {}'.format(process.exitcode))
+                continue
+            if shard is None:
+                running -= 1
+            elif isinstance(shard, str):
+                raise RuntimeError('dataset worker failed:\n' + shard)
+            else:
+                shards.append(shard)
+                _write_index(directory, shards)
+    finally:
+        for process in workers:
+            if running:
+                process.terminate()
+            process.join()
+    _write_index(directory, shards)
+    return sum(records for name, records in shards)
+
+
+class ShardDataset:
+    """Reads a shard directory through memory maps, so only the records a
+    batch touches are paged in.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX)) as f:
+            index = json.load(f)
+        if index['record_size'] != RECORD.itemsize:
+            raise ValueError('record size {} does not match {}'.format(index['record_size'], RECORD.itemsize))
+        self.shards = [np.memmap(os.path.join(directory, shard['file']), dtype=RECORD, mode='r',
+                                 shape=(shard['records'],))
+                       for shard in index['shards'] if shard['records']]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def records(self, indices):
+        indices = np.asarray(indices)
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        batch = np.empty(len(indices), dtype=RECORD)
+        for shard_id in np.unique(shard_ids):
+            rows = shard_ids == shard_id
+            batch[rows] = self.shards[shard_id][indices[rows] - self.offsets[shard_id]]
+        return batch
+
+    def sample(self, batch_size, rng=None):
+        """A random minibatch as a dict of arrays with boards unpacked to
+        `(batch_size, 22, 10)` uint8.
+        """
+        rng = rng or np.random.default_rng()
+        return decode(self.records(rng.integers(0, len(self), batch_size)))
+
+
+def decode(records):
+    return {
+        'boards': unpack_boards(records['board']),
+        'pieces': records['pieces'],
+        'actions': records['action'],
+        'rewards': records['reward'],
+        'dones': records['done'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a self-play dataset of memory-mapped shards.')
+    parser.add_argument('directory')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shard-mb', type=float, default=64)
+    parser.add_argument('--max-steps', type=int, default=None)
+    args = parser.parse_args()
+    records = generate(args.directory, args.games, n_workers=args.workers, seed=args.seed,
+                       shard_bytes=int(args.shard_mb * (1 << 20)), max_steps=args.max_steps)
+    print('{} records written to {}'.format(records, args.directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1161 @@
+from collections import deque, namedtuple
+import random
+from enum import Enum
+import numpy as np
+from tetris_features import features, row_transitions
+from tetris_hash import ZobristKeys
+
+GRAY = (128, 128, 128)
+
+class TetroType(Enum):
+    I = 1
+    J = 2
+    L = 3
+    O = 4
+    S = 5
+    Z = 6
+    T = 7
+    SHADOW = 8
+
+class control(Enum):
+    RIGHT_ROTATE = 1
+    LEFT_ROTATE = 2
+    LEFT = 3
+    RIGHT = 4
+    HARD = 5
+    DOWN = 6
+    HOLD = 7
+    RESTART = 8
+
+    LONG_LEFT = 9
+    LONG_RIGHT = 10
+    SOFT_DROP = 11
+    DROP_RIGHT = 12
+    DROP_LEFT = 13
+
+BAG = [TetroType.I, TetroType.J, TetroType.L, TetroType.O, TetroType.S, TetroType.Z, TetroType.T]
+
+
+def seven_bags(seed, start=0):
+    """Endless 7-bags of piece types for game `seed`, from bag `start` on.
+
+    Every bag is shuffled by its own generator seeded from (seed, bag
+    number), so a game is reproducible from the seed and bag count alone.
+    """
+    number = start
+    while True:
+        bag = list(BAG)
+        random.Random((seed << 32) + number).shuffle(bag)
+        yield bag
+        number += 1
+
+# README move format: D and M values to controls
+drop_mapping = {
+    0: control.HARD,
+    1: control.SOFT_DROP,
+    2: control.DROP_LEFT,
+    3: control.DROP_RIGHT,
+}
+move_mapping = {
+    0: control.LONG_LEFT,
+    1: control.LONG_RIGHT,
+    2: None
+}
+
+
+class Tetromino:
+    __slots__ = ('type_', 'is_shadow', 'rotation', 'x', 'y', 'images')
+
+    rotations = {
+        TetroType.I : [[4, 5, 6, 7], [2, 6, 10, 14], [8, 9, 10, 11], [1, 5, 9, 13]],
+        TetroType.J : [[0, 4, 5, 6], [1, 2, 5, 9], [4, 5, 6, 10], [1, 5, 8, 9]],
+        TetroType.L : [[2, 4, 5, 6], [1, 5, 9, 10], [4, 5, 6, 8], [0, 1, 5, 9]],
+        TetroType.O : [[1, 2, 5, 6]],
+        TetroType.S : [[1, 2, 4, 5], [1, 5, 6, 10], [5, 6, 8, 9], [0, 4, 5, 9]],
+        TetroType.Z : [[0, 1, 5, 6], [2, 5, 6, 9], [4, 5, 9, 10], [1, 4, 5, 8]],
+        TetroType.T : [[1, 4, 5, 6], [1, 5, 6, 9], [4, 5, 6, 9], [1, 4, 5, 9]],
+    }
+
+    colors = {
+        TetroType.I : (0, 255, 255),
+        TetroType.J : (0, 0, 255),
+        TetroType.L : (255, 127, 0),
+        TetroType.O : (255, 255, 0),
+        TetroType.S : (0, 255, 0),
+        TetroType.Z : (255, 0, 0),
+        TetroType.T : (128, 0, 128),
+        TetroType.SHADOW : GRAY
+    }
+
+    type2idx = {
+        TetroType.I : 1,
+        TetroType.J : 2,
+        TetroType.L : 3,
+        TetroType.O : 4,
+        TetroType.S : 5,
+        TetroType.Z : 6,
+        TetroType.T : 7,
+    }
+
+    def __init__(self, type_, is_shadow=False):
+        self.type_ = type_
+        self.is_shadow = is_shadow
+        self.rotation = 0
+        self.x = 3
+        self.y = 0
+        self.images = GEOMETRY[self.type_]
+
+    @property
+    def color(self):
+        return GRAY if self.is_shadow else self.colors[self.type_]
+
+    @property
+    def cur_x(self):
+        return self.x + self.geometry().left
+
+    @property
+    def max_x(self):
+        return 10 - self.geometry().width
+
+    def image(self):
+        return self.rotations[self.type_][self.rotation]
+
+    def geometry(self):
+        return self.images[self.rotation]
+
+    def rotate(self, rotation_type):
+        self.rotation = (self.rotation + rotation_type) % len(self.images)
+
+    def reset(self, type_):
+        # reuse this piece as a fresh `type_` at the spawn position
+        self.type_ = type_
+        self.images = GEOMETRY[type_]
+        self.rotation = 0
+        self.x = 3
+        self.y = 0
+
+
+class PieceGeometry:
+    """Cell layout of one rotation image, derived once from `Tetromino.rotations`.
+
+    Coordinates are (row, column) offsets inside the 4x4 box whose top-left
+    corner sits at the piece's (y, x). `masks[x]` holds the row bit masks
+    already shifted to board column x, for every x in [min_x, max_x].
+    """
+
+    def __init__(self, image, board_width=10):
+        self.cells = [(p // 4, p % 4) for p in sorted(image)]
+        columns = [j for i, j in self.cells]
+        self.left = min(columns)
+        self.right = max(columns)
+        self.width = self.right - self.left + 1
+        self.top = min(i for i, j in self.cells)
+        self.bottom_row = max(i for i, j in self.cells)
+        # lowest occupied row offset of each column, from left to right
+        self.bottom = [max(i for i, j in self.cells if j == col)
+                       for col in range(self.left, self.right + 1)]
+        self.min_x = -self.left
+        self.max_x = board_width - 1 - self.right
+
+        self.row_masks = []
+        for i in range(self.top, self.bottom_row + 1):
+            bits = sum(1 << j for r, j in self.cells if r == i)
+            self.row_masks.append((i, bits))
+        self.masks = {}
+        for x in range(self.min_x, self.max_x + 1):
+            self.masks[x] = [(i, bits << x if x >= 0 else bits >> -x) for i, bits in self.row_masks]
+        # the same cells as one int with bit (row * board_width + column)
+        self.board_masks = {x: sum(bits << (i * board_width) for i, bits in masks)
+                            for x, masks in self.masks.items()}
+
+
+GEOMETRY = {
+    type_: [PieceGeometry(image) for image in images]
+    for type_, images in Tetromino.rotations.items()
+}
+
+
+class PieceQueue:
+    """Upcoming piece types in a fixed-size ring buffer.
+
+    Pieces come a bag at a time from `seven_bags(seed, bags)`, and a pop
+    tops the buffer back up to `preview + 1` pieces, so the next piece and
+    the preview after it are always known. `bags` counts the bags drawn.
+    """
+    __slots__ = ('seed', 'bags', 'preview', 'source', 'buffer', 'start', 'size', 'popped')
+
+    def __init__(self, seed, preview=5, bags=0, pieces=()):
+        self.seed = seed
+        self.bags = bags
+        self.preview = preview
+        self.source = seven_bags(seed, bags)
+        self.buffer = [None] * (max(len(pieces), preview + 1) + len(BAG))
+        self.start = 0
+        self.size = 0
+        self.popped = 0
+        for type_ in pieces:
+            self._push(type_)
+        self._fill(preview + 1)
+
+    def _push(self, type_):
+        self.buffer[(self.start + self.size) % len(self.buffer)] = type_
+        self.size += 1
+
+    def _fill(self, n):
+        if n + len(BAG) - 1 > len(self.buffer):
+            # only when asked for more than the preview at once
+            self.buffer = list(self) + [None] * (n + len(BAG) - 1 - self.size)
+            self.start = 0
+        while self.size < n:
+            for type_ in next(self.source):
+                self._push(type_)
+            self.bags += 1
+
+    def pop(self):
+        type_ = self.buffer[self.start]
+        self.start = (self.start + 1) % len(self.buffer)
+        self.size -= 1
+        self.popped += 1
+        self._fill(self.preview + 1)
+        return type_
+
+    def peek(self, n):
+        self._fill(n)
+        buffer, start, capacity = self.buffer, self.start, len(self.buffer)
+        return [buffer[(start + k) % capacity] for k in range(n)]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        buffer, start, capacity = self.buffer, self.start, len(self.buffer)
+        return (buffer[(start + k) % capacity] for k in range(self.size))
+
+
+class Placement:
+    """A final resting position of a piece and the shortest input path to it.
+
+    `cells` are (row, column) board coordinates and `mask` has bit
+    `row * width + column` set for each of them. `path` is a list of
+    `control` moves accepted by `TetrisEngine.apply`, ending in `control.HARD`.
+    `spin` is 1 if the path's last move before the drop is a rotation, 2 if
+    that rotation used the fifth kick offset, and 0 otherwise.
+    """
+
+    def __init__(self, type_, rotation, x, y, hold, t_spin, mini, path, spin=0, width=10):
+        self.type_ = type_
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+        self.hold = hold
+        self.t_spin = t_spin
+        self.mini = mini
+        self.path = path
+        self.spin = spin
+        self.cells = [(y + i, x + j) for i, j in GEOMETRY[type_][rotation].cells]
+        self.mask = sum(1 << (row * width + col) for row, col in self.cells)
+
+    def __repr__(self):
+        return 'Placement({}, r={}, x={}, y={}, hold={}, t_spin={}, mini={})'.format(
+            self.type_.name, self.rotation, self.x, self.y, self.hold, self.t_spin, self.mini)
+
+
+# Everything needed to resume a game between two engine calls. Pieces are
+# stored as types (and (type, rotation, x, y) for the active one), the board
+# as row bits plus the color plane. `tracking` keeps the incrementally kept
+# board hash and features and `planes` the board and colour observation
+# planes, so restore does not rescan the board; None means rebuild them.
+Snapshot = namedtuple('Snapshot', [
+    'rows', 'field', 'figure', 'held', 'used_held', 'seed', 'bags', 'queue',
+    'score', 'prev_score', 'reward', 'combo', 'b2b', 'last_move', 'last_kick',
+    'state', 'counter', 'remaining_time', 'tracking', 'planes',
+], defaults=(None, None))
+
+
+# Result of `TetrisEngine.afterstates`: one row per placement, in the order
+# of `placements`, which `action` indexes into.
+Afterstates = namedtuple('Afterstates', [
+    'boards', 'lines', 't_spin', 'mini', 'combo', 'b2b', 'reward', 'done',
+    'action', 'placements',
+])
+
+class TetrisEngine:
+    """Game rules without pygame: no event queue, no wall clock.
+
+    Time advances one logical tick per `step()`; `fps` is the number of ticks
+    in one second of game time, so gravity and `remaining_time` behave as in
+    the real-time game but can be run as fast as the CPU allows.
+    """
+    height = 22
+    width = 10
+    fps = 10000
+    time_limit = 120000
+
+    score_table = {
+        'Double' : 1,
+        'Triple' : 2,
+        'Tetris' : 4,
+        'TSM' : 1,
+        'TSS' : 2,
+        'TSD' : 4,
+        'TST' : 6,
+        'b2b Tetris' : 6,
+        'b2b TSM' : 2,
+        'b2b TSS' : 3,
+        'b2b TSD' : 6,
+        'b2b TST' : 9,
+    }
+
+    wall_kick = [
+        [(0, 0), ( 0, 0), ( 0, 0), ( 0, 0), ( 0, 0)],
+        [(0, 0), (+1, 0), (+1, -1), ( 0,+2), (+1,+2)],
+        [(0, 0), ( 0, 0), ( 0, 0), ( 0, 0), ( 0, 0)],
+        [(0, 0), (-1, 0), (-1, -1), ( 0,+2), (-1,+2)],
+    ]
+
+    I_wall_kick = [
+        [( 0, 0), (-1, 0), (+2, 0), (-1, 0), (+2, 0)],
+        [(-1, 0), ( 0, 0), ( 0, 0), ( 0,+1), ( 0,-2)],
+        [(-1,+1), (+1,+1), (-2,+1), (+1, 0), (-2, 0)],
+        [( 0,+1), ( 0,+1), ( 0,+1), ( 0,-1), ( 0,+2)],
+    ]
+
+    combo_table = [0, 1, 1, 2, 2, 3, 3, 4]
+    _kick_cache = {}
+
+    full_row = (1 << width) - 1
+    zobrist_keys = ZobristKeys(height, width)
+    # cells of every possible row bits value, for writing observation rows
+    row_cells = ((np.arange(1 << width)[:, None] >> np.arange(width)) & 1).astype(np.uint8)
+    # observation planes: occupancy, piece colour index, active piece, ghost
+    planes = ('board', 'color', 'active', 'ghost')
+
+    def __init__(self, bitboard=True, seed=None, preview=5):
+        self.bitboard = bitboard
+        # a game is reproducible from its seed, see `seven_bags`
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.preview = preview
+        self.recorder = None
+        self.used_held = False
+        self.last_move = None
+        self.last_kick = None
+        self.b2b = False
+        self.combo = -1
+        self.prev_score = 0
+        self.score = 0
+        self.figure = None
+        self.held = None
+        self.shadow = None
+        self.field = deque()
+        self.rows = [0] * self.height
+        self.state = 'start'
+        self.queue = PieceQueue(self.seed, preview)
+        self.remaining_time = self.time_limit
+        self.counter = 0
+        self.reward = 0
+        self.running = True
+
+        for i in range(self.height):
+            new_line = []
+            for j in range(self.width):
+                new_line.append(0)
+            self.field.append(new_line)
+        self._init_observation()
+        self._reset_tracking(self.rows)
+
+    def _intersects(self, shadow=False):
+        item = self.shadow if shadow else self.figure
+        return self._collides(item.geometry(), item.x, item.y)
+
+    def _collides(self, geometry, x, y):
+        if self.bitboard:
+            masks = geometry.masks.get(x)
+            if masks is None:
+                return True
+            if geometry.bottom_row + y > self.height - 1:
+                return True
+            rows = self.rows
+            for i, bits in masks:
+                if i + y >= 0 and rows[i + y] & bits:
+                    return True
+            return False
+
+        for i, j in geometry.cells:
+            if i + y > self.height - 1:
+                return True
+            if j + x > self.width - 1 or j + x < 0:
+                return True
+            # rows above the field are empty, as in the bitboard path
+            if i + y >= 0 and self.field[i + y][j + x] != 0:
+                return True
+        return False
+
+    def _drop_y(self, geometry, x, y):
+        # the row above the first one from y down where the piece collides;
+        # a piece above the stack in all its columns lands on the heights
+        if self.bitboard and x in geometry.masks:
+            land_y = min(self.height - 1 - self.heights[x + geometry.left + k] - bottom
+                         for k, bottom in enumerate(geometry.bottom))
+            if y <= land_y:
+                return land_y
+        while not self._collides(geometry, x, y):
+            y += 1
+        return y - 1
+
+    def _clear(self):
+        if self.bitboard:
+            cleared = [line for line in range(self.height) if self.rows[line] == self.full_row]
+            for line in reversed(cleared):
+                del self.rows[line]
+                del self.field[line]
+            for i in range(len(cleared)):
+                self.rows.insert(0, 0)
+                self.field.appendleft([0 for j in range(self.width)])
+            if cleared:
+                self._track_clear(cleared)
+            return len(cleared)
+
+        cleared = []
+        # check which lines are cleared
+        for line in range(self.height - 1, -1, -1):
+            for j in range(self.width):
+                if self.field[line][j] == 0:
+                    break
+                elif j == self.width - 1:
+                    cleared.append(line)
+        # update
+        for line in cleared:
+            del self.field[line]
+        for i in range(len(cleared)):
+            self.field.appendleft([0 for j in range(self.width)])
+        return len(cleared)
+
+    # Board features are kept per column (heights, filled cell counts) and
+    # per row (row transitions, column transitions with the row above), so
+    # a lock only touches the piece's rows and a clear only shifts lists.
+    # The board's Zobrist hash and the board and colour observation planes
+    # are kept alongside.
+    def _reset_tracking(self, rows):
+        self._reset_observation(rows)
+        self.board_hash = self.zobrist_keys.board(rows)
+        self.heights = [0] * self.width
+        self.column_counts = [0] * self.width
+        for i, bits in enumerate(rows):
+            for j in range(self.width):
+                if bits >> j & 1:
+                    self.column_counts[j] += 1
+                    if not self.heights[j]:
+                        self.heights[j] = self.height - i
+        self.row_trans = [row_transitions(bits, self.width) for bits in rows]
+        self.column_trans = [self._column_transitions(rows, i) for i in range(self.height + 1)]
+
+    def _column_transitions(self, rows, i):
+        # between row i - 1 and row i, with empty space above and a full floor
+        above = rows[i - 1] if i else 0
+        below = rows[i] if i < self.height else self.full_row
+        return (above ^ below).bit_count()
+
+    def _update_row_features(self, i):
+        self.row_trans[i] = row_transitions(self.rows[i], self.width)
+        self.column_trans[i] = self._column_transitions(self.rows, i)
+        self.column_trans[i + 1] = self._column_transitions(self.rows, i + 1)
+
+    def _track_freeze(self):
+        figure = self.figure
+        if figure.y + figure.geometry().top < 0:
+            # cells above the field wrap around in _freeze
+            self._reset_tracking(self.rows)
+            return
+        board, color = self.observation[0], self.observation[1]
+        for i, bits in figure.geometry().masks[figure.x]:
+            self._update_row_features(figure.y + i)
+            self.board_hash ^= self.zobrist_keys.row(figure.y + i, bits)
+            board[figure.y + i] = self.row_cells[self.rows[figure.y + i]]
+        index = Tetromino.type2idx[figure.type_]
+        for i, j in figure.geometry().cells:
+            color[figure.y + i, j + figure.x] = index
+            self.column_counts[j + figure.x] += 1
+            self.heights[j + figure.x] = max(self.heights[j + figure.x], self.height - figure.y - i)
+
+    def _track_clear(self, cleared):
+        self.board_hash = self.zobrist_keys.board(self.rows)
+        lowest = cleared[-1]
+        kept = [i for i in range(lowest) if i not in cleared]
+        locked = self.observation[:2]
+        locked[:, len(cleared):lowest + 1] = locked[:, kept]
+        locked[:, :len(cleared)] = 0
+        for line in reversed(cleared):
+            del self.row_trans[line]
+        self.row_trans[:0] = [row_transitions(0, self.width)] * len(cleared)
+        # rows below the lowest cleared line did not move
+        for i in range(cleared[-1] + 2):
+            self.column_trans[i] = self._column_transitions(self.rows, i)
+        for j in range(self.width):
+            self.column_counts[j] -= len(cleared)
+            height = self.heights[j] - len(cleared)
+            while height and not self.rows[self.height - height] >> j & 1:
+                height -= 1
+            self.heights[j] = height
+
+    def features(self):
+        """`Features` of the locked cells, read from incrementally kept counts."""
+        if not self.bitboard:
+            self._reset_tracking(self._occupancy())
+        return features(self.heights, sum(self.heights) - sum(self.column_counts),
+                        sum(self.row_trans), sum(self.column_trans), self.height)
+
+    def zobrist(self, window=5):
+        """64-bit Zobrist hash of the board cells, the active and held piece
+        types, the next `window` pieces and the combo/b2b state.
+
+        Before the next piece spawns, the head of the queue counts as the
+        active piece, so the hash does not depend on when it spawns.
+        """
+        keys = self.zobrist_keys
+        key = self.board_hash if self.bitboard else keys.board(self._occupancy())
+        types = [self.figure.type_] if self.figure else []
+        types += self._peek(window + 1 - len(types))
+        key ^= keys.active[types[0].value]
+        key ^= keys.held[self.held.type_.value if self.held else 0]
+        for slot, type_ in enumerate(types[1:]):
+            key ^= keys.queue[slot][type_.value]
+        key ^= keys.combo[min(self.combo + 1, len(keys.combo) - 1)]
+        if self.b2b:
+            key ^= keys.b2b
+        return key
+
+    def _occupancy(self):
+        if self.bitboard:
+            return self.rows
+        return [sum(1 << j for j, mino in enumerate(row) if mino) for row in self.field]
+
+    def _loc_val(self, y, x):
+        if x >= self.width or x < 0:
+            return 1
+        elif y >= self.height:
+            return 1
+        elif y < 0:
+            return 0
+        elif self.bitboard:
+            return self.rows[y] >> x & 1
+        else:
+            return self.field[y][x]
+
+    def _spin_corners(self, rotation, x, y):
+        # front corners first, then the two behind the T's flat side
+        front_pos = [(0, 0), (0, 2), (2, 2), (2, 0), (0, 0)]
+        back_pos = [(2, 2), (2, 0), (0, 0), (0, 2), (2, 2)]
+        check_list = []
+        for pos_list in [front_pos, back_pos]:
+            for i in range(2):
+                check_list.append(self._loc_val(y + pos_list[rotation + i][0], x + pos_list[rotation + i][1]))
+        return check_list
+
+    @staticmethod
+    def _spin_type(check_list, last_move, last_kick):
+        T_spin = False
+        mini = False
+        if last_move == 'r' and len(check_list) != 0:
+            if check_list[0] != 0 and check_list[1] != 0:
+                T_spin = True
+            elif check_list[0] != 0 or check_list[1] != 0:
+                count = 0
+                for mino in check_list[2:]:
+                    if mino != 0:
+                        count += 1
+                if count == 2:
+                    T_spin = True
+                    mini = True
+                if last_kick == 4:
+                    mini = False
+        return T_spin, mini
+
+    def _clear_points(self, cleared_lines, T_spin, mini, b2b, combo, perfect):
+        points = 0
+        if cleared_lines == 4:
+            if b2b:
+                points += self.score_table['b2b Tetris']
+            else:
+                points += self.score_table['Tetris']
+        elif cleared_lines == 3:
+            if T_spin:
+                if b2b:
+                    points += self.score_table['b2b TST']
+                else:
+                    points += self.score_table['TST']
+            else:
+                points += self.score_table['Triple']
+        elif cleared_lines == 2:
+            if T_spin:
+                if b2b:
+                    points += self.score_table['b2b TSD']
+                else:
+                    points += self.score_table['TSD']
+            else:
+                points += self.score_table['Double']
+        elif cleared_lines == 1:
+            if T_spin:
+                if mini:
+                    if b2b:
+                        points += self.score_table['b2b TSM']
+                    else:
+                        points += self.score_table['TSM']
+                else:
+                    if b2b:
+                        points += self.score_table['b2b TSS']
+                    else:
+                        points += self.score_table['TSS']
+
+        if combo >= len(self.combo_table):
+            points += self.combo_table[-1]
+        elif combo != -1:
+            points += self.combo_table[combo]
+
+        if perfect:
+            points += 10
+        return points
+
+    def _calc_score(self, cleared_lines, check_list):
+        T_spin, mini = self._spin_type(check_list, self.last_move, self.last_kick)
+
+        if self.bitboard:
+            perfect = not any(self.rows)
+        else:
+            perfect = True
+            for i in range(self.height):
+                for j in range(self.width):
+                    if self.field[i][j] != 0:
+                        perfect = False
+                        break
+        self.score += self._clear_points(cleared_lines, T_spin, mini, self.b2b, self.combo, perfect)
+
+        if cleared_lines == 4 or T_spin:
+            self.b2b = True
+        else:
+            self.b2b = False
+
+        self.reward = self.score - self.prev_score
+        self.prev_score = self.score
+
+
+    def _freeze(self):
+        for i, j in self.figure.geometry().cells:
+            if i + self.figure.y < 2:
+                self.state = 'gameover'
+            self.field[i + self.figure.y][j + self.figure.x] = self.figure.type_
+            if self.bitboard:
+                self.rows[i + self.figure.y] |= 1 << (j + self.figure.x)
+        if self.bitboard:
+            self._track_freeze()
+
+        check_list = []
+        if self.figure.type_ == TetroType.T:
+            check_list = self._spin_corners(self.figure.rotation, self.figure.x, self.figure.y)
+
+        cleared_lines = self._clear()
+        if cleared_lines == 0:
+            self.combo = -1
+        else:
+            self.combo += 1
+            self._calc_score(cleared_lines, check_list)
+
+        figure, self.figure = self.figure, None
+        held, self.used_held = self.used_held, False
+        if self.recorder is not None:
+            self.recorder.record(self, figure, held)
+
+    def _hard_drop(self):
+        figure = self.figure
+        figure.y = self._drop_y(figure.geometry(), figure.x, max(figure.y, 0))
+        self._freeze()
+
+    def _down(self):
+        prev_move = self.last_move
+        self.last_move = 'd'
+        self.figure.y += 1
+        if self._intersects():
+            self.figure.y -= 1
+            self.last_move = prev_move
+
+    def _move(self, dir):
+        if self.figure:
+            temp = self.figure.x
+            add = 1 if dir == 'right' else -1
+            self.figure.x += add
+            if self._intersects():
+                self.figure.x = temp
+        self._update_shadow()
+        self.last_move = 'm'
+
+    def _kick_offsets(self, ori, new, type_):
+        key = (ori, new, type_)
+        if key in self._kick_cache:
+            return self._kick_cache[key]
+        table = self.I_wall_kick if type_ == TetroType.I else self.wall_kick
+        check_list = []
+        for i in range(5):
+            check_list.append(tuple((table[ori][i][0] - table[new][i][0],
+                                    table[new][i][1] - table[ori][i][1])))
+        self._kick_cache[key] = check_list
+        return check_list
+
+    def _kick(self, ori, new, type_):
+        check_list = self._kick_offsets(ori, new, type_)
+        original_pos = (self.figure.x, self.figure.y)
+        for i, pos in enumerate(check_list):
+            self.figure.x += pos[0]
+            self.figure.y += pos[1]
+            if self._intersects():
+                self.figure.x, self.figure.y = original_pos
+                continue
+            else:
+                self.last_kick = i
+                return True
+        return False
+
+    def _rotate(self, type_: int):
+        original_rotate = self.figure.rotation
+        self.figure.rotate(type_)
+        new_rotate = self.figure.rotation
+        if not self._kick(original_rotate, new_rotate, type_):
+            self.figure.rotate(type_ * -1)
+        self._update_shadow()
+        self.last_move = 'r'
+
+    def _make_shadow(self):
+        if self.shadow is None:
+            self.shadow = Tetromino(self.figure.type_, is_shadow=True)
+        elif self.shadow.type_ != self.figure.type_:
+            self.shadow.reset(self.figure.type_)
+        self.shadow.rotation = self.figure.rotation
+        self.shadow.x = self.figure.x
+        self.shadow.y = max(self.figure.y, 0)
+
+    def _update_shadow(self):
+        self._make_shadow()
+        shadow = self.shadow
+        shadow.y = self._drop_y(shadow.geometry(), shadow.x, shadow.y)
+
+    def _hold(self):
+        held = self.figure
+        held.reset(held.type_)
+        self.figure = self.held
+        self.held = held
+        if self.figure:
+            self._update_shadow()
+        self.last_move = None
+
+    def _peek(self, n):
+        # types of the next n pieces
+        return self.queue.peek(n)
+
+    def _update_tetro(self):
+        if self.figure is None and self.state not in ['gameover', 'timeup']:
+            self.figure = Tetromino(self.queue.pop())
+            self._update_shadow()
+
+    def _update_counter(self, elapsed=None, ticks=1):
+        # gravity moves the piece down once every fps / 10 ticks
+        gravity = self.fps / 10
+        drops = int((self.counter + ticks) // gravity - self.counter // gravity)
+        self.counter += ticks
+        if self.state == 'start':
+            for i in range(drops):
+                self._down()
+
+        if self.state not in ['gameover', 'timeup']:
+            self.remaining_time -= ticks * 1000 / self.fps if elapsed is None else elapsed
+        if self.remaining_time <= 0:
+            self.state = 'timeup'
+
+    def apply(self, move: control):
+        self._update_tetro()
+        if self.state in ['gameover', 'timeup'] or not self.figure:
+            return
+        if move == control.RIGHT_ROTATE:
+            self._rotate(1)
+        elif move == control.LEFT_ROTATE:
+            self._rotate(-1)
+        elif move == control.HARD:
+            self._hard_drop()
+        elif move == control.DOWN:
+            self._down()
+        elif move == control.SOFT_DROP:
+            prev_y = None
+            while self.figure.y != prev_y:
+                prev_y = self.figure.y
+                self._down()
+        elif move == control.LEFT:
+            self._move('left')
+        elif move == control.RIGHT:
+            self._move('right')
+        elif move in [control.LONG_LEFT, control.LONG_RIGHT]:
+            prev_x = None
+            while self.figure.x != prev_x:
+                prev_x = self.figure.x
+                self._move('left' if move == control.LONG_LEFT else 'right')
+        elif move == control.HOLD:
+            if not self.used_held:
+                self._hold()
+                self.used_held = True
+
+    def place(self, moves):
+        # apply a whole placement at once, without ticks in between
+        for move in moves:
+            self.apply(move)
+
+    def lock(self, placement):
+        # same result as place(placement.path), without replaying the moves
+        self._update_tetro()
+        if placement.hold:
+            self.apply(control.HOLD)
+            self._update_tetro()
+        figure = self.figure
+        figure.rotation, figure.x, figure.y = placement.rotation, placement.x, placement.y
+        self.last_move = 'r' if placement.spin else 'm'
+        self.last_kick = 4 if placement.spin == 2 else 0
+        self._freeze()
+
+    def step(self, ticks=1):
+        # `ticks` > 1 advances the clock and gravity as that many steps would
+        self._update_tetro()
+        self._update_counter(ticks=ticks)
+        return self.counter
+
+    def plan_moves(self, rotation, x: int, down: control, dm: control, turn: int):
+        self._update_tetro()
+
+        if rotation == 4:
+            return [control.HOLD]
+
+        images = GEOMETRY[self.figure.type_]
+        geometry = images[(self.figure.rotation + rotation) % len(images)]
+
+        place_tetro_move = []
+        cur_x = self.figure.x + geometry.left
+        max_x = self.width - geometry.width
+        x = min(x, max_x)
+
+        if rotation == 0:
+            place_tetro_move += []
+        elif rotation == 1:
+            place_tetro_move += [control.RIGHT_ROTATE]
+        elif rotation == 2:
+            place_tetro_move += [control.RIGHT_ROTATE for i in range(2)]
+        elif rotation == 3:
+            place_tetro_move += [control.LEFT_ROTATE]
+
+        # left and right
+        if x == 0:
+            place_tetro_move += [control.LONG_LEFT]
+        elif x == max_x:
+            place_tetro_move += [control.LONG_RIGHT]
+        elif x == 1:
+            place_tetro_move += [control.LONG_LEFT, control.RIGHT]
+        elif x == max_x - 1:
+            place_tetro_move += [control.LONG_RIGHT, control.LEFT]
+        else:
+            distance = x - cur_x
+            if distance < 0:
+                move = control.LEFT
+                distance *= -1
+            else:
+                move = control.RIGHT
+            place_tetro_move += [move for i in range(distance)]
+
+        # drop
+        if down == control.HARD:
+            place_tetro_move += [control.HARD]
+            return place_tetro_move
+        else:
+            place_tetro_move += [control.SOFT_DROP]
+
+        if dm is not None:
+            place_tetro_move += [dm]
+
+        if down == control.DROP_RIGHT:
+            place_tetro_move += [control.RIGHT_ROTATE for i in range(turn)]
+        elif down == control.DROP_LEFT:
+            place_tetro_move += [control.LEFT_ROTATE for i in range(turn)]
+
+        place_tetro_move += [control.HARD]
+        return place_tetro_move
+
+    def placements(self, hold=True):
+        """Every distinct resting placement of the current piece and, if
+        holding is allowed, of the piece that `control.HOLD` would bring in.
+
+        Paths only use moves, rotations that succeed under `_kick`,
+        `control.DOWN` and `control.SOFT_DROP`, so each placement's T-spin
+        flags are exactly what `_calc_score` sees when the path is applied.
+        """
+        self._update_tetro()
+        if self.figure is None:
+            return []
+        spin = 0
+        if self.last_move == 'r':
+            spin = 2 if self.last_kick == 4 else 1
+        result = self._search(self.figure.type_, self.figure.rotation, self.figure.x, self.figure.y, spin, False)
+        if hold and not self.used_held:
+            type_ = self.held.type_ if self.held else self._peek(1)[0]
+            result += self._search(type_, 0, 3, 0, 0, True)
+        return result
+
+    def _search(self, type_, rotation, x, y, spin, hold):
+        images = GEOMETRY[type_]
+        is_t = type_ == TetroType.T
+        if not is_t:
+            spin = 0
+        start = (x, y, rotation, spin)
+        parents = {start: None}
+        frontier = deque([start])
+        found = {}
+        placements = []
+        # states reached by control.DOWN land where their SOFT_DROP sibling
+        # does, so they only need expanding
+        falling = {}
+        width = self.width
+        # highest row with a locked cell
+        top = next((i for i, bits in enumerate(self._occupancy()) if bits), self.height)
+        if self.bitboard:
+            # test all rows of a piece against the board with one int op
+            board = sum(bits << (i * width) for i, bits in enumerate(self.rows))
+            bottom = self.height - 1
+
+            def collides(geometry, x, y):
+                mask = geometry.board_masks.get(x)
+                if mask is None or geometry.bottom_row + y > bottom:
+                    return True
+                return board & (mask << y * width if y >= 0 else mask >> -y * width) != 0
+        else:
+            collides = self._collides
+
+        def drop(geometry, x, y):
+            while not collides(geometry, x, y + 1):
+                y += 1
+            return y
+
+        while frontier:
+            state = frontier.popleft()
+            x, y, rotation, spin = state
+            geometry = images[rotation]
+
+            # same landing row as _hard_drop, which restarts from row 0;
+            # pieces that would lock above the field are not placements
+            drop_y = falling.pop(state, None)
+            if drop_y is not None:
+                land_y = None
+            else:
+                drop_y = drop(geometry, x, y)
+                land_y = drop_y if y >= 0 else drop(geometry, x, -1)
+            if land_y is not None and land_y + geometry.top >= 0:
+                t_spin = mini = False
+                if is_t:
+                    check_list = self._spin_corners(rotation, x, land_y)
+                    t_spin, mini = self._spin_type(check_list, 'r' if spin else None, 4 if spin == 2 else 0)
+                key = (geometry.board_masks[x] << land_y * width if land_y >= 0
+                       else geometry.board_masks[x] >> -land_y * width, t_spin, mini)
+                if key not in found:
+                    path = [control.HARD]
+                    node = state
+                    while parents[node] is not None:
+                        parent, move = parents[node]
+                        path += [move] * (node[1] - parent[1] if move == control.DOWN else 1)
+                        node = parent
+                    if hold:
+                        path.append(control.HOLD)
+                    path.reverse()
+                    found[key] = Placement(type_, rotation, x, land_y, hold, t_spin, mini, path, spin, width)
+                    placements.append(found[key])
+
+            neighbours = []
+            for move, dx in [(control.LEFT, -1), (control.RIGHT, 1)]:
+                if not collides(geometry, x + dx, y):
+                    neighbours.append(((x + dx, y, rotation, 0), move))
+            if len(images) > 1:
+                for move, direction in [(control.RIGHT_ROTATE, 1), (control.LEFT_ROTATE, -1)]:
+                    new_rotation = (rotation + direction) % len(images)
+                    offsets = self._kick_offsets(rotation, new_rotation, direction)
+                    for i, (dx, dy) in enumerate(offsets):
+                        if not collides(images[new_rotation], x + dx, y + dy):
+                            new_spin = (2 if i == 4 else 1) if is_t else 0
+                            neighbours.append(((x + dx, y + dy, new_rotation, new_spin), move))
+                            break
+            if drop_y != y:
+                neighbours.append(((x, drop_y, rotation, 0), control.SOFT_DROP))
+                # one row at a time reaches notches and spins above the floor.
+                # Rows where the piece and its kicks (two rows either way)
+                # only meet open space all play alike, so those are skipped
+                down_y = max(y + 1, min(drop_y, top - 5))
+                neighbours.append(((x, down_y, rotation, 0), control.DOWN))
+
+            for next_state, move in neighbours:
+                if next_state not in parents:
+                    parents[next_state] = (state, move)
+                    frontier.append(next_state)
+                    if move == control.DOWN:
+                        falling[next_state] = drop_y
+        return placements
+
+    def afterstates(self, hold=True):
+        """Every board `placements(hold)` can lead to, as one batch.
+
+        `boards` is a contiguous (P, height, width) uint8 array of occupancy
+        after the piece locks and lines clear; `combo`, `b2b` and `reward` are
+        what `_freeze` and `_calc_score` would leave behind, and `done` marks
+        placements that lock inside the top two rows.
+        """
+        placements = self.placements(hold)
+        rows = self._occupancy()
+        n = len(placements)
+        after = np.zeros((n, self.height), dtype=np.int64)
+        lines = np.zeros(n, dtype=np.int64)
+        combo = np.full(n, -1, dtype=np.int64)
+        b2b = np.full(n, self.b2b, dtype=bool)
+        reward = np.zeros(n, dtype=np.int64)
+        done = np.zeros(n, dtype=bool)
+
+        for p, placement in enumerate(placements):
+            board = list(rows)
+            for i, bits in GEOMETRY[placement.type_][placement.rotation].masks[placement.x]:
+                board[placement.y + i] |= bits
+            kept = [row for row in board if row != self.full_row]
+            cleared = self.height - len(kept)
+            after[p, cleared:] = kept
+            lines[p] = cleared
+            done[p] = placement.y + GEOMETRY[placement.type_][placement.rotation].top < 2
+            if cleared:
+                combo[p] = self.combo + 1
+                b2b[p] = cleared == 4 or placement.t_spin
+                reward[p] = self._clear_points(cleared, placement.t_spin, placement.mini,
+                                               self.b2b, self.combo + 1, not any(kept))
+
+        boards = ((after[:, :, None] >> np.arange(self.width)) & 1).astype(np.uint8)
+        return Afterstates(
+            boards, lines, np.array([p.t_spin for p in placements], dtype=bool),
+            np.array([p.mini for p in placements], dtype=bool), combo, b2b, reward,
+            done, np.arange(n), placements)
+
+    def snapshot(self):
+        figure = self.figure
+        if figure is not None:
+            figure = (figure.type_, figure.rotation, figure.x, figure.y)
+        tracking = planes = None
+        if self.bitboard:
+            tracking = (self.board_hash, tuple(self.heights), tuple(self.column_counts),
+                        tuple(self.row_trans), tuple(self.column_trans))
+            # bytes, so snapshots stay hashable and comparable
+            planes = self.observation[:2].tobytes()
+        return Snapshot(
+            tuple(self.rows), tuple(tuple(row) for row in self.field), figure,
+            self.held.type_ if self.held else None, self.used_held, self.seed, self.queue.bags,
+            tuple(self.queue), self.score, self.prev_score, self.reward, self.combo,
+            self.b2b, self.last_move, self.last_kick, self.state, self.counter,
+            self.remaining_time, tracking, planes)
+
+    def restore(self, snapshot):
+        self.rows = list(snapshot.rows)
+        self.field = deque(list(row) for row in snapshot.field)
+        self.figure = None
+        if snapshot.figure is not None:
+            type_, rotation, x, y = snapshot.figure
+            self.figure = Tetromino(type_)
+            self.figure.rotation, self.figure.x, self.figure.y = rotation, x, y
+        self.held = Tetromino(snapshot.held) if snapshot.held else None
+        self.used_held = snapshot.used_held
+        self.seed = snapshot.seed
+        self.queue = PieceQueue(self.seed, self.preview, snapshot.bags, snapshot.queue)
+        self.score = snapshot.score
+        self.prev_score = snapshot.prev_score
+        self.reward = snapshot.reward
+        self.combo = snapshot.combo
+        self.b2b = snapshot.b2b
+        self.last_move = snapshot.last_move
+        self.last_kick = snapshot.last_kick
+        self.state = snapshot.state
+        self.counter = snapshot.counter
+        self.remaining_time = snapshot.remaining_time
+        self.shadow = None
+        if snapshot.tracking is None:
+            self._reset_tracking(self.rows)
+        else:
+            if snapshot.planes is None:
+                self._reset_observation(self.rows)
+            else:
+                self.observation[:2] = np.frombuffer(snapshot.planes, dtype=np.uint8).reshape(2, self.height, self.width)
+            self.board_hash, heights, column_counts, row_trans, column_trans = snapshot.tracking
+            self.heights = list(heights)
+            self.column_counts = list(column_counts)
+            self.row_trans = list(row_trans)
+            self.column_trans = list(column_trans)
+        if self.figure:
+            self._update_shadow()
+
+    # The observation lives in preallocated uint8 arrays. The board and
+    # colour planes are written as pieces lock and rows clear; the piece
+    # list and the active and ghost planes are refreshed by get_state when
+    # they changed.
+    def _init_observation(self):
+        self.observation = np.zeros((len(self.planes), self.height, self.width), dtype=np.uint8)
+        self.observed_pieces = np.zeros(2 + self.preview, dtype=np.uint8)
+        self.observed = None
+        self.observed_items = None
+        self.observation_views = []
+        for array in (self.observation, self.observation[0], self.observed_pieces):
+            view = array.view()
+            view.flags.writeable = False
+            self.observation_views.append(view)
+
+    def _reset_observation(self, rows):
+        self.observation[0] = self.row_cells[rows]
+        self.observation[1] = [[Tetromino.type2idx[mino] if mino else 0 for mino in row] for row in self.field]
+
+    def _observe_pieces(self):
+        # cur, held and the preview only change when a piece spawns or is held
+        key = (self.figure, self.held, self.queue, self.queue.popped)
+        if key == self.observed:
+            return
+        pieces = self.observed_pieces
+        pieces[0] = Tetromino.type2idx[self.figure.type_] if self.figure else 0
+        pieces[1] = Tetromino.type2idx[self.held.type_] if self.held else 0
+        for k, type_ in enumerate(self._peek(self.preview)):
+            pieces[2 + k] = Tetromino.type2idx[type_]
+        self.observed = key
+
+    def _observe_items(self):
+        items = [(item, item.x, item.y, item.rotation) if item else None for item in (self.figure, self.shadow)]
+        if items == self.observed_items:
+            return
+        for plane, item in zip(self.observation[2:], (self.figure, self.shadow)):
+            plane.fill(0)
+            if item is not None:
+                for i, j in item.geometry().cells:
+                    if i + item.y >= 0:
+                        plane[i + item.y, j + item.x] = 1
+        self.observed_items = items
+
+    def get_state(self, out=None, rich=False):
+        """`(board, cur_held_next)` as read-only uint8 views.
+
+        The views belong to the engine and change as the game goes on; pass
+        `out=(board, cur_held_next)` arrays to get a copy instead. With
+        `rich`, the board is a `(4, height, width)` stack of the `planes`:
+        occupancy, colour index (`Tetromino.type2idx`), active piece and
+        ghost.
+        """
+        self._update_tetro()
+        if not self.bitboard:
+            self._reset_observation(self._occupancy())
+        self._observe_pieces()
+        planes, board, pieces = self.observation_views
+        if rich:
+            self._observe_items()
+            board = planes
+        if out is None:
+            return board, pieces
+        np.copyto(out[0], board)
+        np.copyto(out[1], pieces)
+        return out
+
+    def get_reward(self):
+        return self.reward
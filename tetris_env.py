@@ -0,0 +1,68 @@
+from tetris_engine import TetrisEngine, drop_mapping, move_mapping
+
+
+class ActionSpace:
+    """Discrete indices over the README `R X D M T` moves.
+
+    Hard drops ignore M and T, plain soft drops ignore T, and rotating soft
+    drops use 1 to 3 turns, so every index is a distinct move. The last
+    index is the hold move `4 0 0 2 0`.
+    """
+
+    def __init__(self, width=TetrisEngine.width):
+        self.moves = []
+        for r in range(4):
+            for x in range(width):
+                self.moves.append((r, x, 0, 2, 0))
+                for m in range(3):
+                    self.moves.append((r, x, 1, m, 0))
+                for d in [2, 3]:
+                    for m in range(3):
+                        for t in range(1, 4):
+                            self.moves.append((r, x, d, m, t))
+        self.moves.append((4, 0, 0, 2, 0))
+        self.index = {move: i for i, move in enumerate(self.moves)}
+        self.n = len(self.moves)
+
+    def decode(self, action):
+        return self.moves[action]
+
+    def encode(self, r, x, d, m, t):
+        return self.index[(r, x, d, m, t)]
+
+    def sample(self, rng):
+        return rng.randrange(self.n)
+
+
+class TetrisEnv:
+    """Synchronous, headless wrapper around `TetrisEngine`.
+
+    `step` applies one whole move and returns `(obs, reward, done, info)`,
+    where `obs` is the `(board, cur_held_next)` pair from `get_state` and
+    `reward` is the score gained by that move. `obs` holds read-only views
+    that the next step overwrites; copy them to keep them.
+    """
+    action_space = ActionSpace()
+
+    def __init__(self, max_steps=None):
+        self.max_steps = max_steps
+        self.game = None
+        self.steps = 0
+
+    def reset(self, seed=None):
+        self.game = TetrisEngine(seed=seed)
+        self.steps = 0
+        return self.game.get_state()
+
+    def step(self, action):
+        r, x, d, m, t = self.action_space.decode(action)
+        prev_score = self.game.score
+        self.game.place(self.game.plan_moves(r, x, drop_mapping[d], move_mapping[m], t))
+        self.steps += 1
+
+        reward = self.game.score - prev_score
+        done = self.game.state != 'start'
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            done = True
+        info = {'score': self.game.score, 'state': self.game.state, 'combo': self.game.combo, 'b2b': self.game.b2b}
+        return self.game.get_state(), reward, done, info
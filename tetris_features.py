@@ -0,0 +1,46 @@
+from collections import namedtuple
+import numpy as np
+
+# Board features used by hand-tuned and learned evaluators. Walls count as
+# filled for row transitions and wells, the floor as filled and the space
+# above the board as empty for column transitions.
+Features = namedtuple('Features', [
+    'heights', 'holes', 'row_transitions', 'column_transitions', 'wells', 'bumpiness',
+])
+
+
+def row_transitions(bits, width):
+    padded = bits << 1 | 1 | 1 << (width + 1)
+    return ((padded ^ padded >> 1) & ((1 << (width + 1)) - 1)).bit_count()
+
+
+def features(heights, holes, row_trans, column_trans, height):
+    walls = [height] + list(heights) + [height]
+    wells = tuple(max(0, min(walls[c], walls[c + 2]) - h) for c, h in enumerate(heights))
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return Features(tuple(heights), holes, row_trans, column_trans, wells, bumpiness)
+
+
+def board_features(boards):
+    """`Features` of a (N, height, width) stack of boards, one entry per board.
+
+    Non-zero cells are filled, so `get_state` boards, `afterstates().boards`
+    and color fields all work.
+    """
+    filled = np.asarray(boards) != 0
+    n, height, width = filled.shape
+    heights = np.where(filled.any(axis=1), height - filled.argmax(axis=1), 0)
+    holes = heights.sum(axis=1) - filled.sum(axis=(1, 2))
+
+    wall = np.ones((n, height, 1), dtype=bool)
+    rows = np.concatenate([wall, filled, wall], axis=2)
+    row_trans = (rows[:, :, 1:] != rows[:, :, :-1]).sum(axis=(1, 2))
+    columns = np.concatenate([np.zeros((n, 1, width), dtype=bool), filled,
+                              np.ones((n, 1, width), dtype=bool)], axis=1)
+    column_trans = (columns[:, 1:] != columns[:, :-1]).sum(axis=(1, 2))
+
+    walls = np.full((n, 1), height)
+    padded = np.concatenate([walls, heights, walls], axis=1)
+    wells = np.maximum(np.minimum(padded[:, :-2], padded[:, 2:]) - heights, 0)
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return Features(heights, holes, row_trans, column_trans, wells, bumpiness)
@@ -0,0 +1,99 @@
+import random
+
+CHUNK = 5
+
+
+class ZobristKeys:
+    """Random 64-bit keys for every board cell and piece slot.
+
+    Keys come from a fixed seed, so equal positions hash equally across runs
+    and processes. Row hashes are looked up `CHUNK` columns at a time: each
+    chunk table entry is the xor of the cell keys for that bit pattern.
+    """
+
+    def __init__(self, height, width, window=14, max_combo=24, seed=0x7E7215):
+        rng = random.Random(seed)
+        self.cells = [[rng.getrandbits(64) for j in range(width)] for i in range(height)]
+        self.chunks = []
+        for row in self.cells:
+            tables = []
+            for start in range(0, width, CHUNK):
+                keys = row[start:start + CHUNK]
+                table = [0] * (1 << len(keys))
+                for bits in range(1, len(table)):
+                    low = bits & -bits
+                    table[bits] = table[bits ^ low] ^ keys[low.bit_length() - 1]
+                tables.append(table)
+            self.chunks.append(tables)
+        # piece keys are indexed by TetroType value, 0 standing for no piece
+        self.active = [0] + [rng.getrandbits(64) for i in range(8)]
+        self.held = [0] + [rng.getrandbits(64) for i in range(8)]
+        self.queue = [[0] + [rng.getrandbits(64) for i in range(8)] for slot in range(window)]
+        self.combo = [rng.getrandbits(64) for i in range(max_combo)]
+        self.b2b = rng.getrandbits(64)
+
+    def row(self, i, bits):
+        key = 0
+        for table in self.chunks[i]:
+            key ^= table[bits & ((1 << CHUNK) - 1)]
+            bits >>= CHUNK
+        return key
+
+    def board(self, rows):
+        key = 0
+        for i, bits in enumerate(rows):
+            if bits:
+                key ^= self.row(i, bits)
+        return key
+
+
+class TranspositionTable:
+    """Fixed-size table from Zobrist keys to search results.
+
+    A key owns the slot `key & (size - 1)`. Storing into an occupied slot,
+    for the same key or a colliding one, replaces the entry only if it is
+    from an earlier search (see `new_search`) or was searched no deeper than
+    the new one.
+    """
+
+    def __init__(self, size=1 << 16):
+        size = 1 << max(size - 1, 1).bit_length()
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.depths = [0] * size
+        self.ages = [0] * size
+        self.age = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.keys[key & self.mask] == key
+
+    def get(self, key, default=None, depth=0):
+        slot = key & self.mask
+        if self.keys[slot] == key and self.depths[slot] >= depth:
+            return self.values[slot]
+        return default
+
+    def put(self, key, value, depth=0):
+        slot = key & self.mask
+        old = self.keys[slot]
+        if old is not None and self.ages[slot] == self.age and self.depths[slot] > depth:
+            return False
+        if old is None:
+            self.count += 1
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.ages[slot] = self.age
+        return True
+
+    def new_search(self):
+        """Mark every stored entry as replaceable, keeping it readable."""
+        self.age += 1
+
+    def clear(self):
+        self.__init__(len(self.keys))
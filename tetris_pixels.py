@@ -0,0 +1,116 @@
+import numpy as np
+from tetris_engine import GEOMETRY, GRAY, TetroType, Tetromino, TetrisEngine
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+# board cell codes: 0 empty, 1-7 `Tetromino.type2idx`, then the ghost
+GHOST = 8
+LUMA = np.array([0.299, 0.587, 0.114])
+
+
+class PixelRenderer:
+    """Draws engines into NumPy images laid out like the `Tetris` window.
+
+    At `scale` 1 a frame is 500 x 400 pixels with the board, hold and
+    preview panels where `_update_ui` puts them; the score, timer and
+    game-over overlay are left out. Every board cell and every panel is a
+    tile built once, so a frame is a few array copies whatever the board
+    holds. Frames are `(H, W, 3)` uint8 RGB, or `(H, W, 1)` with `grayscale`.
+    """
+
+    def __init__(self, scale=1.0, grayscale=False, preview=5):
+        self.grayscale = grayscale
+        self.preview = preview
+        # every offset of the window layout is a multiple of half a cell
+        self.half = half = max(2, int(round(10 * scale)))
+        self.cell = 2 * half
+        self.panel = 6 * half
+        self.board_x = 10 * half
+        self.board_y = 2 * half + 2 * self.cell
+        self.hold_x = 4 * half
+        self.next_x = self.board_x + self.cell * TetrisEngine.width
+        self.panel_y = 2 * half + 2 * self.cell
+        self.rows = TetrisEngine.height - 2
+        height = max(50 * half, self.panel_y + self.panel * preview)
+        self.shape = (height, 40 * half, 1 if grayscale else 3)
+
+        colors = [WHITE] + [Tetromino.colors[type_] for type_ in Tetromino.type2idx] + [GRAY]
+        self.background = self._convert(np.full((height, 40 * half, 3), WHITE, dtype=np.uint8))
+        self.cell_tiles = self._convert(np.stack([self._cell_tile(color) for color in colors]))
+        types = [None] + list(Tetromino.type2idx)
+        self.panel_tiles = self._convert(np.stack([self._panel_tile(type_) for type_ in types]))
+
+    def _convert(self, image):
+        if not self.grayscale:
+            return image
+        return np.rint(image @ LUMA)[..., None].astype(np.uint8)
+
+    def _cell_tile(self, color):
+        # the grid line around a board cell, filled with `color`
+        tile = np.empty((self.cell, self.cell, 3), dtype=np.uint8)
+        tile[:] = GRAY
+        tile[1:-1, 1:-1] = color
+        return tile
+
+    def _panel_tile(self, type_):
+        half = self.half
+        tile = np.full((self.panel, self.panel, 3), WHITE, dtype=np.uint8)
+        tile[[0, -1], :] = GRAY
+        tile[:, [0, -1]] = GRAY
+        if type_ is None:
+            return tile
+        x_edge, y_edge = 1.5, 2
+        if type_ == TetroType.I:
+            x_edge, y_edge = 1, 1.5
+        elif type_ == TetroType.O:
+            x_edge = 1
+        x, y = int(half * x_edge), int(half * y_edge)
+        for i, j in GEOMETRY[type_][0].cells:
+            block = tile[y + half * i:y + half * (i + 1), x + half * j:x + half * (j + 1)]
+            block[:] = BLACK
+            block[1:-1, 1:-1] = Tetromino.colors[type_]
+        return tile
+
+    def _codes(self, game):
+        planes, pieces = game.get_state(rich=True)
+        codes = planes[1].astype(np.uint8)
+        active = planes[2].astype(bool)
+        ghost = planes[3].astype(bool)
+        figure = Tetromino.type2idx[game.figure.type_] if game.figure else 0
+        # while playing the piece covers its ghost; once the game is over the
+        # ghost is drawn last, as the locked position
+        if game.state in ['gameover', 'timeup']:
+            codes[active] = figure
+            codes[ghost] = GHOST
+        else:
+            codes[ghost] = GHOST
+            codes[active] = figure
+        return codes[2:], pieces
+
+    def render(self, game, out=None):
+        return self.render_batch([game], None if out is None else out[None])[0]
+
+    def render_batch(self, games, out=None):
+        """`(N, H, W, C)` uint8 frames of `games`, written into `out` when
+        given.
+        """
+        n = len(games)
+        codes = np.empty((n, self.rows, TetrisEngine.width), dtype=np.uint8)
+        panels = np.zeros((n, 1 + self.preview), dtype=np.uint8)
+        for k, game in enumerate(games):
+            codes[k], pieces = self._codes(game)
+            count = min(len(pieces) - 1, 1 + self.preview)
+            panels[k, :count] = pieces[1:1 + count]
+
+        if out is None:
+            out = np.empty((n,) + self.shape, dtype=np.uint8)
+        out[:] = self.background
+        cell, channels = self.cell, self.shape[2]
+        board = self.cell_tiles[codes]
+        board = board.transpose(0, 1, 3, 2, 4, 5).reshape(n, self.rows * cell, TetrisEngine.width * cell, channels)
+        out[:, self.board_y:self.board_y + self.rows * cell, self.board_x:self.board_x + TetrisEngine.width * cell] = board
+        for slot in range(1 + self.preview):
+            x = self.hold_x if slot == 0 else self.next_x
+            y = self.panel_y + self.panel * max(slot - 1, 0)
+            out[:, y:y + self.panel, x:x + self.panel] = self.panel_tiles[panels[:, slot]]
+        return out
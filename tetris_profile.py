@@ -0,0 +1,170 @@
+import time
+
+# Tetris.step phases, by the method that runs them. TetrisEngine has no
+# input, event or render phase; methods a game lacks are skipped.
+PHASES = {
+    '_update_tetro': 'spawn',
+    '_update_counter': 'clock',
+    '_poll_keys': 'input',
+    '_handle_events': 'events',
+    '_update_ui': 'render',
+}
+# upper bounds of the histogram buckets, in milliseconds; the last bucket
+# holds everything slower
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100]
+
+
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        ms = seconds * 1000
+        bucket = 0
+        while bucket < len(BUCKETS_MS) and ms > BUCKETS_MS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+    def as_dict(self):
+        return {'count': self.count, 'total_ms': self.total * 1000,
+                'mean_ms': self.total * 1000 / self.count if self.count else 0.0,
+                'max_ms': self.max * 1000, 'histogram': list(self.histogram)}
+
+
+class StepProfiler:
+    """Opt-in timing of `step` phases and counts of collision tests, kick
+    attempts and cleared lines for one game.
+
+    The profiler wraps the game's methods on the instance, so games without
+    one attached run the plain class methods and pay nothing. After every
+    step, each callback gets a dict of seconds spent per phase in that step
+    ('step' is the whole call). A phase entered from inside another one, e.g.
+    a spawn triggered by a key press, counts in both. With `summary_every`,
+    `report` receives `format()` every that many steps.
+    """
+
+    def __init__(self, game, summary_every=None, report=print):
+        self.game = game
+        self.summary_every = summary_every
+        self.report = report
+        self.callbacks = []
+        self.stats = {'step': PhaseStats()}
+        self.stats.update({phase: PhaseStats() for phase in PHASES.values()})
+        self.counters = {'steps': 0, 'intersects': 0, 'kicks': 0, 'lines': 0}
+        self.current = {}
+        self.worst = {}
+        self.wrapped = []
+        self.attach()
+
+    def _wrap(self, name, wrapper):
+        method = getattr(self.game, name, None)
+        if method is not None:
+            setattr(self.game, name, wrapper(method))
+            self.wrapped.append(name)
+
+    def _timed(self, phase):
+        stats = self.stats[phase]
+        current = self.current
+
+        def wrapper(method):
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    stats.add(elapsed)
+                    current[phase] = current.get(phase, 0.0) + elapsed
+            return timed
+        return wrapper
+
+    def _step(self, method):
+        def step(*args, **kwargs):
+            self.current.clear()
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            self.current['step'] = elapsed
+            self.stats['step'].add(elapsed)
+            if elapsed >= self.stats['step'].max:
+                self.worst = dict(self.current)
+            self.counters['steps'] += 1
+            for callback in self.callbacks:
+                callback(self.current)
+            if self.summary_every and self.counters['steps'] % self.summary_every == 0:
+                self.report(self.format())
+            return result
+        return step
+
+    def _counted(self, method):
+        def intersects(*args, **kwargs):
+            self.counters['intersects'] += 1
+            return method(*args, **kwargs)
+        return intersects
+
+    def _kicks(self, method):
+        def kick(ori, new, type_):
+            found = method(ori, new, type_)
+            self.counters['kicks'] += self.game.last_kick + 1 if found else len(self.game._kick_offsets(ori, new, type_))
+            return found
+        return kick
+
+    def _lines(self, method):
+        def clear():
+            cleared = method()
+            self.counters['lines'] += cleared
+            return cleared
+        return clear
+
+    def attach(self):
+        if self.wrapped:
+            return
+        for name, phase in PHASES.items():
+            self._wrap(name, self._timed(phase))
+        self._wrap('step', self._step)
+        self._wrap('_intersects', self._counted)
+        self._wrap('_kick', self._kicks)
+        self._wrap('_clear', self._lines)
+
+    def detach(self):
+        for name in self.wrapped:
+            del self.game.__dict__[name]
+        self.wrapped = []
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.__init__()
+        for key in self.counters:
+            self.counters[key] = 0
+        self.worst = {}
+
+    def summary(self):
+        return {
+            'phases': {phase: stats.as_dict() for phase, stats in self.stats.items() if stats.count},
+            'counters': dict(self.counters),
+            'worst_step_ms': {phase: seconds * 1000 for phase, seconds in self.worst.items()},
+            'buckets_ms': BUCKETS_MS,
+        }
+
+    def format(self):
+        lines = ['{:8s} {:>8s} {:>10s} {:>9s} {:>9s}'.format('phase', 'calls', 'total ms', 'mean ms', 'max ms')]
+        for phase, stats in self.summary()['phases'].items():
+            lines.append('{:8s} {:>8d} {:>10.1f} {:>9.3f} {:>9.3f}'.format(
+                phase, stats['count'], stats['total_ms'], stats['mean_ms'], stats['max_ms']))
+        lines.append(' '.join('{}={}'.format(key, value) for key, value in self.counters.items()))
+        if self.worst:
+            lines.append('slowest step: ' + ' '.join(
+                '{}={:.3f}ms'.format(phase, seconds * 1000) for phase, seconds in self.worst.items()))
+        return '\n'.join(lines)
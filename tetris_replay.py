@@ -0,0 +1,152 @@
+import struct
+from array import array
+from tetris_engine import Snapshot, TetroType, TetrisEngine, control
+
+# Replay file layout (little endian):
+#   header       magic, version, checkpoint interval, seed, record count,
+#                checkpoint count
+#   records      one uint16 per placed piece, see _pack_record
+#   checkpoints  one fixed-size engine state every `checkpoint_every` pieces,
+#                taken before the piece with that index is placed
+MAGIC = b'TTRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQII')
+QUEUE_SLOTS = 28
+CHECKPOINT = struct.Struct('<110sBIB{}siihBbbBid'.format(QUEUE_SLOTS))
+
+STATES = ['start', 'gameover', 'timeup']
+LAST_MOVES = [None, 'd', 'm', 'r']
+
+
+def _pack_record(figure, held, last_move, last_kick):
+    spin = 0
+    if last_move == 'r':
+        spin = 2 if last_kick == 4 else 1
+    return (held | figure.rotation << 1 | (figure.x + 2) << 3
+            | (figure.y + 4) << 7 | spin << 12)
+
+
+def _unpack_record(record):
+    held = record & 1
+    rotation = record >> 1 & 3
+    x = (record >> 3 & 15) - 2
+    y = (record >> 7 & 31) - 4
+    spin = record >> 12 & 3
+    return held, rotation, x, y, spin
+
+
+def _pack_state(game):
+    snapshot = game.snapshot()
+    cells = [0 if mino == 0 else mino.value for row in snapshot.field for mino in row]
+    field = bytes(cells[i] | cells[i + 1] << 4 for i in range(0, len(cells), 2))
+    queue = bytes(type_.value for type_ in snapshot.queue[:QUEUE_SLOTS])
+    return CHECKPOINT.pack(
+        field, snapshot.held.value if snapshot.held else 0, snapshot.bags,
+        len(queue), queue, snapshot.score, snapshot.prev_score, snapshot.combo,
+        snapshot.b2b, -1 if snapshot.last_kick is None else snapshot.last_kick,
+        LAST_MOVES.index(snapshot.last_move), STATES.index(snapshot.state),
+        snapshot.reward, snapshot.remaining_time)
+
+
+def _unpack_state(game, data):
+    (field, held, bags, queue_len, queue, score, prev_score, combo, b2b,
+     last_kick, last_move, state, reward, remaining_time) = CHECKPOINT.unpack(data)
+    cells = []
+    for byte in field:
+        cells += [byte & 15, byte >> 4]
+    rows = []
+    colors = []
+    for i in range(game.height):
+        row = cells[i * game.width:(i + 1) * game.width]
+        rows.append(sum(1 << j for j, value in enumerate(row) if value))
+        colors.append(tuple(TetroType(value) if value else 0 for value in row))
+    game.restore(Snapshot(
+        tuple(rows), tuple(colors), None, TetroType(held) if held else None,
+        False, game.seed, bags, tuple(TetroType(value) for value in queue[:queue_len]),
+        score, prev_score, reward, combo, bool(b2b), LAST_MOVES[last_move],
+        None if last_kick == -1 else last_kick, STATES[state], 0, remaining_time))
+
+
+class ReplayWriter:
+    """Records every piece `game` locks and writes a replay file on close.
+
+    The game must have been created with the seed that should be stored,
+    and must not have placed any piece yet.
+    """
+
+    def __init__(self, path, game: TetrisEngine, checkpoint_every=256):
+        self.path = path
+        self.game = game
+        self.seed = game.seed
+        self.checkpoint_every = checkpoint_every
+        self.records = array('H')
+        self.checkpoints = []
+        game.recorder = self
+
+    def record(self, game, figure, held):
+        self.records.append(_pack_record(figure, held, game.last_move, game.last_kick))
+        if len(self.records) % self.checkpoint_every == 0:
+            self.checkpoints.append(_pack_state(game))
+
+    def close(self):
+        if self.game.recorder is self:
+            self.game.recorder = None
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.checkpoint_every, self.seed,
+                                len(self.records), len(self.checkpoints)))
+            f.write(self.records.tobytes())
+            for checkpoint in self.checkpoints:
+                f.write(checkpoint)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Replay:
+    """A replay file loaded for re-simulation at engine speed."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, self.checkpoint_every, self.seed, n_records, n_checkpoints = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} replay file'.format(path, VERSION))
+        offset = HEADER.size
+        self.records = array('H')
+        self.records.frombytes(data[offset:offset + n_records * 2])
+        offset += n_records * 2
+        self.checkpoints = [data[offset + i * CHECKPOINT.size:offset + (i + 1) * CHECKPOINT.size]
+                            for i in range(n_checkpoints)]
+
+    def __len__(self):
+        return len(self.records)
+
+    def apply(self, game, record):
+        held, rotation, x, y, spin = _unpack_record(record)
+        game._update_tetro()
+        if held:
+            game.apply(control.HOLD)
+            game._update_tetro()
+        figure = game.figure
+        figure.rotation, figure.x, figure.y = rotation, x, y
+        game.last_move = 'r' if spin else 'm'
+        game.last_kick = 4 if spin == 2 else 0
+        game._freeze()
+
+    def seek(self, index):
+        """Engine state just before the piece at `index` is placed."""
+        game = TetrisEngine(seed=self.seed)
+        start = 0
+        checkpoint = min(index // self.checkpoint_every, len(self.checkpoints))
+        if checkpoint > 0:
+            _unpack_state(game, self.checkpoints[checkpoint - 1])
+            start = checkpoint * self.checkpoint_every
+        for record in self.records[start:index]:
+            self.apply(game, record)
+        return game
+
+    def simulate(self):
+        return self.seek(len(self.records))
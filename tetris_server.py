@@ -0,0 +1,301 @@
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+from tetris_engine import TetrisEngine, drop_mapping, move_mapping
+
+# Every message is a frame: a uint16 body length followed by the body.
+# Requests are `op, game id` plus the op's payload; replies are
+# `status, game id` plus the reply payload, or a UTF-8 message on error.
+# Replies come back in request order, so clients may pipeline requests.
+FRAME = struct.Struct('<H')
+REQUEST = struct.Struct('<BI')
+REPLY = struct.Struct('<BI')
+SEED = struct.Struct('<Q')
+MOVE = struct.Struct('<5B')
+# board rows as column bits, cur/held/next 5 piece indices, score, combo,
+# b2b and game state
+OBSERVATION = struct.Struct('<{}H7BibBB'.format(TetrisEngine.height))
+STEP = struct.Struct('<iB')
+
+NEW = 0      # payload: optional seed; reply: observation
+RESET = 1    # payload: optional seed; reply: observation
+STEP_OP = 2  # payload: R X D M T; reply: reward, done, observation
+OBSERVE = 3  # reply: observation
+CLOSE = 4    # reply: empty
+
+OK = 0
+ERROR = 1
+
+STATES = ['start', 'gameover', 'timeup']
+
+
+def _observe(game):
+    board, pieces = game.get_state()
+    return OBSERVATION.pack(*game._occupancy(), *pieces.tolist(), game.score,
+                            game.combo, game.b2b, STATES.index(game.state))
+
+
+def _check_move(r, x, d, m, t):
+    if r > 4 or x >= TetrisEngine.width or d >= len(drop_mapping) or m >= len(move_mapping) or t > 3:
+        raise ValueError('invalid move {}'.format((r, x, d, m, t)))
+
+
+def decode_observation(data, offset=0):
+    values = OBSERVATION.unpack_from(data, offset)
+    height = TetrisEngine.height
+    rows = np.array(values[:height])
+    board = (rows[:, None] >> np.arange(TetrisEngine.width)) & 1
+    pieces = np.array(values[height:height + 7])
+    score, combo, b2b, state = values[height + 7:]
+    return board, pieces, {'score': score, 'combo': combo, 'b2b': bool(b2b), 'state': STATES[state]}
+
+
+class GameHost:
+    """The games a server hosts, addressed by id from any connection."""
+
+    def __init__(self, max_games=4096):
+        self.max_games = max_games
+        self.games = {}
+        self.locks = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def _new_game(self, payload):
+        seed = SEED.unpack(payload)[0] if payload else None
+        return TetrisEngine(seed=seed)
+
+    def handle(self, body):
+        game_id = 0
+        try:
+            op, game_id = REQUEST.unpack_from(body)
+            payload = body[REQUEST.size:]
+            if op == NEW:
+                game = self._new_game(payload)
+                with self.lock:
+                    if len(self.games) >= self.max_games:
+                        raise ValueError('too many games')
+                    game_id = self.next_id
+                    self.next_id += 1
+                    self.games[game_id] = game
+                    self.locks[game_id] = threading.Lock()
+                return REPLY.pack(OK, game_id) + _observe(game)
+
+            with self.lock:
+                if game_id not in self.games:
+                    raise KeyError('no game {}'.format(game_id))
+                lock = self.locks[game_id]
+            with lock:
+                if op == RESET:
+                    game = self.games[game_id] = self._new_game(payload)
+                    return REPLY.pack(OK, game_id) + _observe(game)
+                game = self.games[game_id]
+                if op == STEP_OP:
+                    r, x, d, m, t = MOVE.unpack(payload)
+                    _check_move(r, x, d, m, t)
+                    prev_score = game.score
+                    if game.state == 'start':
+                        game.place(game.plan_moves(r, x, drop_mapping[d], move_mapping[m], t))
+                    done = game.state != 'start'
+                    return REPLY.pack(OK, game_id) + STEP.pack(game.score - prev_score, done) + _observe(game)
+                if op == OBSERVE:
+                    return REPLY.pack(OK, game_id) + _observe(game)
+                if op == CLOSE:
+                    with self.lock:
+                        del self.games[game_id]
+                        del self.locks[game_id]
+                    return REPLY.pack(OK, game_id)
+                raise ValueError('unknown op {}'.format(op))
+        except Exception as e:
+            return REPLY.pack(ERROR, game_id) + repr(e).encode()[:1000]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        host = self.server.host
+        buf = bytearray()
+        while True:
+            try:
+                data = self.request.recv(1 << 16)
+            except ConnectionResetError:
+                break
+            if not data:
+                break
+            buf += data
+            # answer every complete request that arrived, in one write
+            out = bytearray()
+            offset = 0
+            while len(buf) - offset >= FRAME.size:
+                size, = FRAME.unpack_from(buf, offset)
+                if len(buf) - offset - FRAME.size < size:
+                    break
+                start = offset + FRAME.size
+                reply = host.handle(bytes(buf[start:start + size]))
+                out += FRAME.pack(len(reply)) + reply
+                offset = start + size
+            del buf[:offset]
+            if out:
+                try:
+                    self.request.sendall(out)
+                except (ConnectionResetError, BrokenPipeError):
+                    # the client went away; that ends the connection like EOF
+                    break
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class GameServer:
+    """Serves a `GameHost` on a Unix socket path or a (host, port) address,
+    one thread per connection.
+    """
+
+    def __init__(self, address, max_games=4096):
+        self.address = address
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixServer(address, _Handler)
+        else:
+            self.server = _TCPServer(address, _Handler)
+        self.server.host = GameHost(max_games)
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TetrisClient:
+    """Blocking client for `GameServer`.
+
+    `step_many` sends all its moves before reading any reply, so a round
+    trip is paid once per batch rather than once per move.
+    """
+
+    def __init__(self, address):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buf = bytearray()
+
+    def _send(self, requests):
+        out = bytearray()
+        for op, game_id, payload in requests:
+            body = REQUEST.pack(op, game_id) + payload
+            out += FRAME.pack(len(body)) + body
+        self.sock.sendall(out)
+
+    def _read(self, n):
+        while len(self.buf) < n:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                raise ConnectionError('server closed the connection')
+            self.buf += data
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    def _read_reply(self):
+        size, = FRAME.unpack(self._read(FRAME.size))
+        body = self._read(size)
+        status, game_id = REPLY.unpack_from(body)
+        return status, game_id, body[REPLY.size:]
+
+    def _reply(self):
+        status, game_id, payload = self._read_reply()
+        if status != OK:
+            raise RuntimeError(payload.decode())
+        return game_id, payload
+
+    def _call(self, op, game_id=0, payload=b''):
+        self._send([(op, game_id, payload)])
+        return self._reply()
+
+    def new(self, seed=None):
+        game_id, payload = self._call(NEW, 0, b'' if seed is None else SEED.pack(seed))
+        return game_id, decode_observation(payload)
+
+    def reset(self, game_id, seed=None):
+        return decode_observation(self._call(RESET, game_id, b'' if seed is None else SEED.pack(seed))[1])
+
+    def observe(self, game_id):
+        return decode_observation(self._call(OBSERVE, game_id)[1])
+
+    def step(self, game_id, move):
+        return self.step_many([(game_id, move)])[0]
+
+    def step_many(self, moves):
+        # moves: (game id, (R, X, D, M, T)) pairs, for one or many games
+        self._send([(STEP_OP, game_id, MOVE.pack(*move)) for game_id, move in moves])
+        results = []
+        errors = []
+        # read every reply, even after an error, so the next call starts on
+        # its own replies
+        for i in range(len(moves)):
+            status, game_id, payload = self._read_reply()
+            if status != OK:
+                errors.append('move {}: {}'.format(i, payload.decode()))
+                continue
+            reward, done = STEP.unpack_from(payload)
+            results.append((decode_observation(payload, STEP.size), reward, bool(done)))
+        if errors:
+            raise RuntimeError('; '.join(errors))
+        return results
+
+    def close_game(self, game_id):
+        self._call(CLOSE, game_id)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host headless Tetris games over a socket.')
+    parser.add_argument('--unix', help='Unix domain socket path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--max-games', type=int, default=4096)
+    args = parser.parse_args()
+    address = args.unix or (args.host, args.port)
+    with GameServer(address, args.max_games) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import os
+import queue
+import random
+import threading
+import traceback
+import numpy as np
+from tetris_engine import TetrisEngine, drop_mapping, move_mapping
+
+STEP = 0
+RESET = 1
+CLOSE = 2
+
+
+def _views(buf, n_games):
+    # boards, pieces, rewards, dones, scores, actions and the command word,
+    # laid out back to back in one shared block
+    shapes = [
+        ('boards', np.uint8, (n_games, TetrisEngine.height, TetrisEngine.width)),
+        ('pieces', np.int64, (n_games, 7)),
+        ('rewards', np.int64, (n_games,)),
+        ('dones', np.bool_, (n_games,)),
+        ('scores', np.int64, (n_games,)),
+        ('actions', np.int64, (n_games, 5)),
+        ('command', np.int64, (1,)),
+    ]
+    views = {}
+    offset = 0
+    for name, dtype, shape in shapes:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -offset % 8
+        if buf is not None:
+            views[name] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += size
+    return views, offset
+
+
+def _write(views, g, game):
+    board, cur_held_next = game.get_state()
+    views['boards'][g] = board
+    views['pieces'][g] = cur_held_next
+    views['scores'][g] = game.score
+
+
+def _check_actions(actions, n_games):
+    actions = np.asarray(actions)
+    if actions.shape != (n_games, 5):
+        raise ValueError('expected actions of shape {}, got {}'.format((n_games, 5), actions.shape))
+    r, x, d, m, t = actions.T
+    bad = ((r < 0) | (r > 4) | (x < 0) | (x >= TetrisEngine.width) | (d < 0) | (d >= len(drop_mapping))
+           | (m < 0) | (m >= len(move_mapping)) | (t < 0) | (t > 3))
+    if bad.any():
+        raise ValueError('invalid R X D M T moves for games {}'.format(np.flatnonzero(bad).tolist()))
+    return actions
+
+
+def _worker(shm_name, n_games, games, start, finish, errors):
+    random.seed()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    views, _ = _views(shm.buf, n_games)
+    try:
+        engines = {g: TetrisEngine() for g in games}
+        for g in games:
+            _write(views, g, engines[g])
+        finish.wait()
+
+        while True:
+            start.wait()
+            command = views['command'][0]
+            if command == CLOSE:
+                break
+            for g in games:
+                game = engines[g]
+                if command == RESET or views['dones'][g]:
+                    game = engines[g] = TetrisEngine()
+                    views['rewards'][g] = 0
+                    views['dones'][g] = False
+                else:
+                    r, x, d, m, t = views['actions'][g].tolist()
+                    prev_score = game.score
+                    game.place(game.plan_moves(r, x, drop_mapping[d], move_mapping[m], t))
+                    views['rewards'][g] = game.score - prev_score
+                    views['dones'][g] = game.state != 'start'
+                _write(views, g, game)
+            finish.wait()
+    except threading.BrokenBarrierError:
+        # the driver or another worker gave up
+        pass
+    except Exception:
+        errors.put(traceback.format_exc())
+        start.abort()
+        finish.abort()
+    finally:
+        del views
+        shm.close()
+
+
+class VecTetris:
+    """Runs `n_games` headless games split across worker processes.
+
+    Observations live in one shared-memory block that the workers write in
+    place, so a step costs one barrier round trip instead of pickling boards.
+    The arrays returned by `reset` and `step` are views into that block and
+    are overwritten by the next call; copy them to keep them. Finished games
+    restart on the step after the one that reported them done.
+
+    If a worker fails, or the workers do not answer within `timeout`
+    seconds, the call raises RuntimeError and the environment is closed.
+    """
+
+    def __init__(self, n_games, n_workers=None, timeout=60):
+        self.n_games = n_games
+        self.timeout = timeout
+        n_workers = min(n_workers or os.cpu_count() or 1, n_games)
+        _, size = _views(None, n_games)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.views, _ = _views(self.shm.buf, n_games)
+        self.views['dones'][:] = False
+        self.start = mp.Barrier(n_workers + 1)
+        self.finish = mp.Barrier(n_workers + 1)
+        self.errors = mp.Queue()
+        self.workers = []
+        self.closed = False
+        try:
+            for games in np.array_split(np.arange(n_games), n_workers):
+                worker = mp.Process(target=_worker, daemon=True,
+                                    args=(self.shm.name, n_games, games.tolist(), self.start, self.finish,
+                                          self.errors))
+                worker.start()
+                self.workers.append(worker)
+        except BaseException:
+            self._release()
+            raise
+        self._wait(self.finish)
+
+    def _wait(self, barrier):
+        try:
+            barrier.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            try:
+                error = self.errors.get(timeout=1)
+            except queue.Empty:
+                error = None
+            self._release()
+            if error is None:
+                raise RuntimeError('workers did not respond within {}s'.format(self.timeout)) from None
+            raise RuntimeError('worker failed:\n' + error) from None
+
+    def _run(self, command):
+        if self.closed:
+            raise RuntimeError('VecTetris is closed')
+        self.views['command'][0] = command
+        self._wait(self.start)
+        if command != CLOSE:
+            self._wait(self.finish)
+
+    def _observation(self):
+        return self.views['boards'], self.views['pieces']
+
+    def reset(self):
+        self._run(RESET)
+        return self._observation()
+
+    def step(self, actions):
+        # actions: (n_games, 5) array of R X D M T moves
+        self.views['actions'][:] = _check_actions(actions, self.n_games)
+        self._run(STEP)
+        return self._observation(), self.views['rewards'], self.views['dones']
+
+    def _release(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.start.abort()
+        self.finish.abort()
+        for worker in self.workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self.views = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # arrays handed out by step() still reference the block
+            pass
+        finally:
+            self.shm.unlink()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._run(CLOSE)
+        finally:
+            self._release()
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()